@@ -0,0 +1,62 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """
+    In-memory LRU cache of string-like values with an optional time-to-live.
+
+    It is bounded both by entry count and by the total size of the stored
+    values, measured with len() (characters, which is about bytes for HTML and
+    CSS). A value larger than the whole budget is not stored. Access goes
+    through a lock, so the cache can be shared by the event loop and worker
+    threads alike.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the value for `key`, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Store a value, evicting the least recently used entries past either limit."""
+        size = len(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _pop(self, key: Hashable) -> None:
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
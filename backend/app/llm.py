@@ -1,23 +1,205 @@
 import os
+import re
 import json
+import random
 import asyncio
-from typing import Dict, Optional
+import hashlib
+import functools
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Final, List, Optional, Tuple, TypeVar
 from dotenv import load_dotenv
 
-import anthropic                # pip install anthropic
-from openai import AsyncOpenAI                  # pip install openai
-from google import genai  # pip install google-generativeai
-from bs4 import BeautifulSoup   # pip install beautifulsoup4
+from selectolax.lexbor import LexborHTMLParser  # pip install selectolax
 import traceback
+# Provider SDKs (anthropic, openai, google-genai) are imported lazily inside the
+# _get_*_client helpers: only one provider is used per process, and each SDK is
+# expensive to import.
+from .cache import LRUCache
 from .scraper import scrape_site
 
+if TYPE_CHECKING:
+    import anthropic
+    from openai import AsyncOpenAI
+    from google import genai
+
 # Load API keys from environment (python-dotenv can automatically load from .env)
 
 load_dotenv(override=True)
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-OPENAI_API_KEY    = os.getenv("OPENAI_API_KEY").strip()
-GEMINI_API_KEY    = os.getenv("GEMINI_API_KEY")
+ANTHROPIC_API_KEY = (os.getenv("ANTHROPIC_API_KEY") or "").strip()
+OPENAI_API_KEY    = (os.getenv("OPENAI_API_KEY") or "").strip()
+GEMINI_API_KEY    = (os.getenv("GEMINI_API_KEY") or "").strip()
+
+# When enabled and more than one provider key is set, query every configured
+# provider concurrently and keep the first successful answer (lower tail latency,
+# at the cost of paying for the losing calls).
+RACE_PROVIDERS = os.getenv("RACE_PROVIDERS", "").strip().lower() in ("1", "true", "yes")
+
+# How often generate_clone_html_batch checks on a submitted batch job.
+BATCH_POLL_INTERVAL = 30  # seconds
+
+# Retry policy for transient provider errors (rate limits, overload, timeouts).
+RETRY_ATTEMPTS = 5
+RETRY_MAX_WAIT = 30  # seconds
+_TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+_TRANSIENT_ERROR_NAMES = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "InternalServerError", "OverloadedError", "ResourceExhausted",
+}
+
+T = TypeVar("T")
+
+# Token limits of the models chosen in _configured_models. The scraped context is
+# trimmed so instruction + context + requested output fit in the context window,
+# instead of sending a request the provider will reject.
+_CONTEXT_WINDOWS = {
+    "claude-3-5-sonnet-20241022": 200_000,
+    "gemini-2.0-flash": 1_048_576,
+    "gpt-4.1": 1_047_576,
+}
+_DEFAULT_CONTEXT_WINDOW = 128_000
+_MAX_OUTPUT_TOKENS = {"anthropic": 4096, "google": 8192, "openai": 32768}
+_INSTRUCTION_TOKEN_RESERVE = 2_000
+# Conservative estimate used when no exact tokenizer is available (HTML/CSS
+# usually averages more than this per token, so the estimate errs on the safe side).
+_CHARS_PER_TOKEN = 3
+
+
+# Prompt sent alongside the scraped page; built once at import time.
+_INSTRUCTION: Final[str] = (
+    "You are tasked with creating a PIXEL-PERFECT visual clone. The result must be VISUALLY IDENTICAL to the original webpage.\n\n"
+    
+    "## ABSOLUTE VISUAL REPLICATION REQUIREMENTS:\n"
+    "1. **EXACT COLORS** - Use every hex code, RGB value, and color from the original CSS\n"
+    "2. **PRESERVE ALL BACKGROUNDS** - Gradients, images, patterns must be IDENTICAL\n"
+    "3. **KEEP ALL IMAGES** - Every image, logo, icon with original src URLs\n"
+    "4. **MAINTAIN EXACT FONTS** - Font families, sizes, weights exactly as original\n"
+    "5. **PRESERVE LAYOUT** - Spacing, positioning, dimensions exactly as original\n"
+    "6. **COPY ALL STYLING** - Shadows, borders, effects, transitions (but remove animations)\n\n"
+    
+    "## CRITICAL VISUAL ELEMENTS TO PRESERVE:\n"
+    "- **Background gradients and colors** - Copy gradient CSS exactly\n"
+    "- **Background images** - Preserve all background-image URLs\n"
+    "- **Brand colors** - Maintain exact brand color palette\n"
+    "- **Typography styling** - Font weights, sizes, letter-spacing\n"
+    "- **Visual effects** - Box-shadows, text-shadows, borders\n"
+    "- **Layout structure** - Grid systems, flexbox, positioning\n"
+    "- **Image assets** - All logos, icons, decorative images\n\n"
+    
+    "## CSS CONSOLIDATION REQUIREMENTS:\n"
+    "1. **Include ALL provided CSS** - Every single CSS rule must be included\n"
+    "2. **Preserve CSS variables** - All custom properties and their values\n"
+    "3. **Maintain media queries** - Responsive breakpoints and rules\n"
+    "4. **Keep vendor prefixes** - All -webkit-, -moz-, -ms- prefixes\n"
+    "5. **Preserve @imports and @font-face** - External fonts and resources\n"
+    "6. **Copy gradient syntax exactly** - Linear, radial gradients with exact values\n\n"
+    
+    "## HTML STRUCTURE PRESERVATION:\n"
+    "- Use the EXACT same HTML structure from the scraped content\n"
+    "- Keep all class names, IDs, and data attributes\n"
+    "- Preserve all img src URLs exactly as provided\n"
+    "- Maintain all semantic elements (nav, main, header, section)\n"
+    "- Keep all text content exactly as it appears\n"
+    "- Preserve form elements with their styling\n\n"
+    
+    "## BACKGROUND AND IMAGE HANDLING:\n"
+    "- **Background gradients**: Copy CSS gradient syntax exactly\n"
+    "- **Background images**: Preserve all background-image URLs\n"
+    "- **IMG tags**: Keep all src attributes unchanged\n"
+    "- **SVG elements**: Preserve inline SVGs completely\n"
+    "- **Icon fonts**: Maintain icon font classes and CSS\n"
+    "- **Decorative elements**: Keep all visual flourishes and effects\n\n"
+    
+    "## COLOR PRESERVATION:\n"
+    "- Extract and use EVERY color from the original CSS\n"
+    "- Preserve hex codes, RGB, RGBA, HSL values exactly\n"
+    "- Maintain CSS custom properties (--color-name: value)\n"
+    "- Keep gradient color stops and positions exact\n"
+    "- Preserve opacity and transparency values\n\n"
+    
+    "## LAYOUT AND SPACING:\n"
+    "- Copy margins, padding, gaps exactly\n"
+    "- Preserve flexbox and grid properties\n"
+    "- Maintain positioning (absolute, relative, fixed)\n"
+    "- Keep z-index values for layering\n"
+    "- Preserve viewport units (vw, vh, vmin, vmax)\n\n"
+    
+    "## JAVASCRIPT REMOVAL (WHILE PRESERVING VISUALS):\n"
+    "- Remove <script> tags but keep all visual elements\n"
+    "- Remove event handlers but preserve CSS classes\n"
+    "- Show the loaded/active state of dynamic elements\n"
+    "- Keep data attributes that affect styling\n"
+    "- Preserve CSS classes added by JavaScript\n\n"
+    
+    "## QUALITY CONTROL CHECKLIST:\n"
+    "✅ Background colors/gradients match original exactly\n"
+    "✅ All images display with original sources\n"
+    "✅ Font families and sizes match perfectly\n"
+    "✅ Spacing and layout proportions identical\n"
+    "✅ Visual effects (shadows, borders) preserved\n"
+    "✅ Brand colors and visual identity intact\n"
+    "✅ No visual elements missing or changed\n\n"
+    
+    "## FAILURE CONDITIONS (NEVER DO THESE):\n"
+    "❌ NEVER use generic colors instead of original colors\n"
+    "❌ NEVER remove background gradients or images\n"
+    "❌ NEVER change font families or styling\n"
+    "❌ NEVER alter spacing or layout structure\n"
+    "❌ NEVER remove or modify image sources\n"
+    "❌ NEVER simplify or strip away visual effects\n\n"
+    
+    "## OUTPUT REQUIREMENTS:\n"
+    "Return ONLY the complete HTML document starting with <!DOCTYPE html>\n"
+    "Include ALL CSS in a single <style> block in the <head>\n"
+    "The result must be visually indistinguishable from the original\n\n"
+    
+    "Create a pixel-perfect visual clone that preserves every color, gradient, image, and visual effect:"
+)
+
+# Identifies the prompt revision so editing _INSTRUCTION invalidates cached clones.
+_INSTRUCTION_DIGEST: Final[str] = hashlib.blake2b(_INSTRUCTION.encode(), digest_size=8).hexdigest()
+
+# Small LRU+TTL cache of raw LLM completions, so repeated scrapes of the same
+# page return immediately instead of paying for another LLM round-trip.
+CACHE_MAX_ENTRIES = 100
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+CACHE_TTL = 60  # seconds
+_clone_cache: "LRUCache[str]" = LRUCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL)
+
+
+# Provider calls currently in flight, keyed like the cache, so concurrent
+# requests for the same page share one call (see _coalesced_completion).
+_inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+
+def _cache_key(provider: str, model_name: str, full_context: str) -> str:
+    context_digest = hashlib.blake2b(full_context.encode(), digest_size=16).hexdigest()
+    return f"{provider}:{model_name}:{_INSTRUCTION_DIGEST}:{context_digest}"
+
+
+def _configured_models() -> List[Dict[str, str]]:
+    models = []
+    if ANTHROPIC_API_KEY:
+        models.append({"provider": "anthropic", "model": "claude-3-5-sonnet-20241022"})
+    if GEMINI_API_KEY:
+        models.append({"provider": "google", "model": "gemini-2.0-flash"})
+    if OPENAI_API_KEY:
+        models.append({"provider": "openai", "model": "gpt-4.1"})
+    return models
+
+
+# API keys are only read at import, so the provider choice is fixed for the
+# lifetime of the process; compute it once instead of on every request.
+_AVAILABLE_MODELS: Final[List[Dict[str, str]]] = _configured_models()
+if not _AVAILABLE_MODELS:
+    print("⚠️ No LLM credentials found; set ANTHROPIC_API_KEY, OPENAI_API_KEY, or GEMINI_API_KEY")
+
+
+def available_models() -> List[Dict[str, str]]:
+    """
+    Return every provider with credentials configured, in order of preference,
+    as dicts like {"provider": "anthropic", "model": "claude-3-5-sonnet-20241022"}.
+    """
+    return _AVAILABLE_MODELS
 
 
 def choose_model() -> Dict[str, str]:
@@ -25,221 +207,602 @@ def choose_model() -> Dict[str, str]:
     Return a dict like {"provider": "anthropic", "model": "claude-3-5-sonnet-20241022"}.
     Fall back to OpenAI GPT-4 if no other keys are present.
     """
-    if ANTHROPIC_API_KEY:
-        return {"provider": "anthropic", "model": "claude-3-5-sonnet-20241022"}
-    elif GEMINI_API_KEY:
-        return {"provider": "google", "model": "gemini-2.0-flash"}
-    elif OPENAI_API_KEY:
-        return {"provider": "openai", "model": "gpt-4.1"}
-    else:
+    if not _AVAILABLE_MODELS:
         raise RuntimeError("No LLM credentials found; set ANTHROPIC_API_KEY, OPENAI_API_KEY, or GEMINI_API_KEY")
+    return _AVAILABLE_MODELS[0]
 
 
-async def generate_clone_html(
+def _build_context(
+    provider: str,
+    model_name: str,
     scraped_html: str,
     scraped_css_list: Optional[list] = None,
     metadata: Optional[dict] = None
 ) -> str:
     """
-    Given the scraped HTML (with CSS inlined) and optional CSS files,
-    call the chosen LLM to produce a static HTML clone. Return the clone as a string.
+    Assemble the page context (HTML, CSS and metadata) sent to the LLM,
+    trimmed to fit the model's context window (see _fit_context).
     """
-    config = choose_model()
-    provider = config["provider"]
-    model_name = config["model"]
-
     if not scraped_html.strip():
         raise ValueError("Empty HTML; nothing to clone")
 
-    # 1) Assemble the combined context
-    parts = [scraped_html]
-    if scraped_css_list:
-        for css in scraped_css_list:
-            parts.append("/* External CSS: */")
-            parts.append(css)
-    full_context = "\n\n".join(parts)
-    primary_font = metadata.get("fonts") or "sans-serif"
+    metadata = metadata or {}
 
-    # 2) Extract metadata values (with sensible defaults)
-    page_title   = metadata.get("title") if metadata and metadata.get("title") else "Untitled Page"
+    # 1) Extract metadata values (with sensible defaults)
+    page_title   = metadata.get("title") or "Untitled Page"
     theme_color  = metadata.get("theme_color") or "#ffffff"
+    primary_font = metadata.get("fonts") or "sans-serif"
     charset      = metadata.get("charset") or "utf-8"
 
-    parts.append(f"\n/* The page's title is '{page_title}', its primary theme color is {theme_color}, it uses the {primary_font} font family, and its charset is {charset}. */\n")
+    metadata_comment = f"\n\n/* The page's title is '{page_title}', its primary theme color is {theme_color}, it uses the {primary_font} font family, and its charset is {charset}. */"
 
-    # 2) Build the prompt
-    instruction = (
-        "You are tasked with creating a PIXEL-PERFECT visual clone. The result must be VISUALLY IDENTICAL to the original webpage.\n\n"
-        
-        "## ABSOLUTE VISUAL REPLICATION REQUIREMENTS:\n"
-        "1. **EXACT COLORS** - Use every hex code, RGB value, and color from the original CSS\n"
-        "2. **PRESERVE ALL BACKGROUNDS** - Gradients, images, patterns must be IDENTICAL\n"
-        "3. **KEEP ALL IMAGES** - Every image, logo, icon with original src URLs\n"
-        "4. **MAINTAIN EXACT FONTS** - Font families, sizes, weights exactly as original\n"
-        "5. **PRESERVE LAYOUT** - Spacing, positioning, dimensions exactly as original\n"
-        "6. **COPY ALL STYLING** - Shadows, borders, effects, transitions (but remove animations)\n\n"
-        
-        "## CRITICAL VISUAL ELEMENTS TO PRESERVE:\n"
-        "- **Background gradients and colors** - Copy gradient CSS exactly\n"
-        "- **Background images** - Preserve all background-image URLs\n"
-        "- **Brand colors** - Maintain exact brand color palette\n"
-        "- **Typography styling** - Font weights, sizes, letter-spacing\n"
-        "- **Visual effects** - Box-shadows, text-shadows, borders\n"
-        "- **Layout structure** - Grid systems, flexbox, positioning\n"
-        "- **Image assets** - All logos, icons, decorative images\n\n"
-        
-        "## CSS CONSOLIDATION REQUIREMENTS:\n"
-        "1. **Include ALL provided CSS** - Every single CSS rule must be included\n"
-        "2. **Preserve CSS variables** - All custom properties and their values\n"
-        "3. **Maintain media queries** - Responsive breakpoints and rules\n"
-        "4. **Keep vendor prefixes** - All -webkit-, -moz-, -ms- prefixes\n"
-        "5. **Preserve @imports and @font-face** - External fonts and resources\n"
-        "6. **Copy gradient syntax exactly** - Linear, radial gradients with exact values\n\n"
-        
-        "## HTML STRUCTURE PRESERVATION:\n"
-        "- Use the EXACT same HTML structure from the scraped content\n"
-        "- Keep all class names, IDs, and data attributes\n"
-        "- Preserve all img src URLs exactly as provided\n"
-        "- Maintain all semantic elements (nav, main, header, section)\n"
-        "- Keep all text content exactly as it appears\n"
-        "- Preserve form elements with their styling\n\n"
-        
-        "## BACKGROUND AND IMAGE HANDLING:\n"
-        "- **Background gradients**: Copy CSS gradient syntax exactly\n"
-        "- **Background images**: Preserve all background-image URLs\n"
-        "- **IMG tags**: Keep all src attributes unchanged\n"
-        "- **SVG elements**: Preserve inline SVGs completely\n"
-        "- **Icon fonts**: Maintain icon font classes and CSS\n"
-        "- **Decorative elements**: Keep all visual flourishes and effects\n\n"
-        
-        "## COLOR PRESERVATION:\n"
-        "- Extract and use EVERY color from the original CSS\n"
-        "- Preserve hex codes, RGB, RGBA, HSL values exactly\n"
-        "- Maintain CSS custom properties (--color-name: value)\n"
-        "- Keep gradient color stops and positions exact\n"
-        "- Preserve opacity and transparency values\n\n"
-        
-        "## LAYOUT AND SPACING:\n"
-        "- Copy margins, padding, gaps exactly\n"
-        "- Preserve flexbox and grid properties\n"
-        "- Maintain positioning (absolute, relative, fixed)\n"
-        "- Keep z-index values for layering\n"
-        "- Preserve viewport units (vw, vh, vmin, vmax)\n\n"
-        
-        "## JAVASCRIPT REMOVAL (WHILE PRESERVING VISUALS):\n"
-        "- Remove <script> tags but keep all visual elements\n"
-        "- Remove event handlers but preserve CSS classes\n"
-        "- Show the loaded/active state of dynamic elements\n"
-        "- Keep data attributes that affect styling\n"
-        "- Preserve CSS classes added by JavaScript\n\n"
-        
-        "## QUALITY CONTROL CHECKLIST:\n"
-        "✅ Background colors/gradients match original exactly\n"
-        "✅ All images display with original sources\n"
-        "✅ Font families and sizes match perfectly\n"
-        "✅ Spacing and layout proportions identical\n"
-        "✅ Visual effects (shadows, borders) preserved\n"
-        "✅ Brand colors and visual identity intact\n"
-        "✅ No visual elements missing or changed\n\n"
-        
-        "## FAILURE CONDITIONS (NEVER DO THESE):\n"
-        "❌ NEVER use generic colors instead of original colors\n"
-        "❌ NEVER remove background gradients or images\n"
-        "❌ NEVER change font families or styling\n"
-        "❌ NEVER alter spacing or layout structure\n"
-        "❌ NEVER remove or modify image sources\n"
-        "❌ NEVER simplify or strip away visual effects\n\n"
-        
-        "## OUTPUT REQUIREMENTS:\n"
-        "Return ONLY the complete HTML document starting with <!DOCTYPE html>\n"
-        "Include ALL CSS in a single <style> block in the <head>\n"
-        "The result must be visually indistinguishable from the original\n\n"
-        
-        "Create a pixel-perfect visual clone that preserves every color, gradient, image, and visual effect:"
-    )
+    # 2) Sites often ship the same stylesheet more than once; send each
+    # distinct block only once.
+    css_blocks = []
+    seen_css = set()
+    for css in scraped_css_list or ():
+        digest = hashlib.blake2b(css.encode(), digest_size=8).digest()
+        if digest in seen_css:
+            continue
+        seen_css.add(digest)
+        css_blocks.append(css)
+
+    # 3) Fit HTML + CSS into the window, then add the metadata, which is never trimmed
+    return _fit_context(provider, model_name, scraped_html, css_blocks, metadata_comment) + metadata_comment
 
+
+@functools.lru_cache(maxsize=None)
+def _openai_encoding(model_name: str):
+    """Return the (expensive to build) tiktoken encoding for a model, or None if unavailable."""
     try:
-        # 3) Call the appropriate LLM API
-        if provider == "anthropic":
-            clone_html = await _call_anthropic_api(model_name, instruction, full_context)
-        elif provider == "openai":
-            clone_html = await _call_openai_api(model_name, instruction, full_context)
-        elif provider == "google":
-            clone_html = await _call_gemini_api(model_name, instruction, full_context)
+        import tiktoken             # pip install tiktoken
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabularies on first use, which can fail offline
+        print(f"tiktoken unavailable for {model_name} ({e}); estimating tokens from length")
+        return None
+
+
+def _fit_context(provider: str, model_name: str, html: str, css_blocks: List[str], reserved: str = "") -> str:
+    """
+    Join the HTML and CSS blocks into the context, dropping CSS from the end
+    until it fits the model's context window alongside `reserved` (text the
+    caller appends afterwards). The HTML is only cut, at a tag boundary, if it
+    does not fit on its own.
+    """
+    budget = (
+        _CONTEXT_WINDOWS.get(model_name, _DEFAULT_CONTEXT_WINDOW)
+        - _MAX_OUTPUT_TOKENS.get(provider, 8192)
+        - _INSTRUCTION_TOKEN_RESERVE
+    )
+    pieces = [f"/* External CSS: */\n\n{css}" for css in css_blocks]
+    # Every token covers at least one character, so short contexts always fit
+    if len(html) + sum(len(p) + 2 for p in pieces) + len(reserved) <= budget:
+        return "\n\n".join([html, *pieces])
+
+    encoding = _openai_encoding(model_name) if provider == "openai" else None
+
+    def count(text: str) -> int:
+        # +1 per piece covers tokens merging across the "\n\n" joins
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=())) + 1
+        return -(-len(text) // _CHARS_PER_TOKEN) + 1
+
+    def cut(text: str, tokens: int, boundary: str) -> str:
+        # Keep about `tokens` tokens of `text`, ending just after the last `boundary`
+        if encoding is not None:
+            text = encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
         else:
-            raise RuntimeError(f"Unsupported provider: {provider}")
+            text = text[:tokens * _CHARS_PER_TOKEN]
+        return text[:text.rfind(boundary) + 1]
+
+    remaining = budget - count(reserved)
+    html_tokens = count(html)
+    if html_tokens > remaining:
+        print(f"HTML alone is ~{html_tokens} tokens; dropping all CSS and truncating it to {remaining} for {model_name}")
+        return cut(html, remaining - 1, ">")
+
+    remaining -= html_tokens
+    parts = [html]
+    for i, piece in enumerate(pieces):
+        tokens = count(piece)
+        if tokens > remaining:
+            # Keep whole rules of the first block that does not fit, drop the rest
+            partial = cut(piece, remaining - 1, "}")
+            if partial:
+                parts.append(partial)
+            print(f"Context exceeds ~{budget} tokens for {model_name}; "
+                  f"trimmed CSS block {i + 1} and dropped {len(pieces) - i - 1} after it")
+            break
+        remaining -= tokens
+        parts.append(piece)
+    return "\n\n".join(parts)
+
+
+async def complete_clone_html(
+    scraped_html: str,
+    scraped_css_list: Optional[list] = None,
+    metadata: Optional[dict] = None
+) -> str:
+    """
+    Call the chosen LLM and return its raw output, markdown fences and all.
+    The caller post-processes it, like the chunks of stream_clone_html.
+    """
+    config = choose_model()
+    provider = config["provider"]
+    model_name = config["model"]
+
+    full_context = _build_context(provider, model_name, scraped_html, scraped_css_list, metadata)
 
-        # 4) Post-process: simple tag validation / sanitization
-        clone_html = _sanitize_and_validate_html(clone_html)
+    # 2) Build the prompt
+    instruction = _INSTRUCTION
 
+    # Serve repeat requests from the cache
+    cache_key = _cache_key(provider, model_name, full_context)
+    clone_html = _clone_cache.get(cache_key)
+    if clone_html is not None:
         return clone_html
 
+    try:
+        # 3) Call the appropriate LLM API
+        return await _coalesced_completion(
+            cache_key, lambda: _complete(provider, model_name, instruction, full_context)
+        )
     except Exception as e:
         traceback.print_exc()
         raise RuntimeError(f"Failed to generate clone with {provider}") from e
 
 
+async def generate_clone_html(
+    scraped_html: str,
+    scraped_css_list: Optional[list] = None,
+    metadata: Optional[dict] = None
+) -> str:
+    """
+    Given the scraped HTML (with CSS inlined) and optional CSS files,
+    call the chosen LLM to produce a static HTML clone. Return the clone as a string.
+    """
+    clone_html = await complete_clone_html(scraped_html, scraped_css_list, metadata)
 
-async def _call_anthropic_api(model_name: str, instruction: str, context: str) -> str:
-    
-    client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
-    
+    # 4) Post-process: simple tag validation / sanitization (CPU-bound, so keep it off the event loop)
+    return await asyncio.to_thread(_sanitize_and_validate_html, clone_html)
+
+
+async def stream_clone_html(
+    scraped_html: str,
+    scraped_css_list: Optional[list] = None,
+    metadata: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_clone_html: yields the raw LLM output as it arrives.
+    The caller joins the chunks and runs _sanitize_and_validate_html on the result.
+    """
+    config = choose_model()
+    provider = config["provider"]
+    model_name = config["model"]
+
+    full_context = _build_context(provider, model_name, scraped_html, scraped_css_list, metadata)
+    instruction = _INSTRUCTION
+
+    cache_key = _cache_key(provider, model_name, full_context)
+    cached = _clone_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
     try:
-        message = await client.messages.create(
-            model=model_name,
-            max_tokens=4096,  # Adjust based on expected output length
-            temperature=0.2,
-            system="You are a helpful assistant for generating HTML clones.",
-            messages=[
-                {
-                    "role": "user",
-                    "content": instruction
-                },
-                {
-                    "role": "user",
-                    "content": context
-                },
-            ]
-        )
-        return message.content[0].text.strip()
+        async for chunk in _stream_provider(provider, model_name, instruction, full_context):
+            parts.append(chunk)
+            yield chunk
     except Exception as e:
-        raise RuntimeError(f"Anthropic API error: {str(e)}")
+        traceback.print_exc()
+        raise RuntimeError(f"Failed to generate clone with {provider}") from e
 
+    _clone_cache.put(cache_key, _join_stripped(parts))
 
-async def _call_openai_api(model_name: str, instruction: str, context: str) -> str:
 
+async def generate_clone_html_batch(requests: List[dict]) -> List[str]:
+    """
+    Clone many pages at once through the provider's Batch API, which is roughly
+    half the price of individual calls but only guarantees results within the
+    provider's completion window. Use it for bulk jobs, not interactive requests.
+
+    Each request is a dict with the "html", "css" and "metadata" keys returned by
+    scrape_site. Returns the sanitized clones in the same order. Providers without
+    a batch path fall back to concurrent generate_clone_html calls.
+    """
+    config = choose_model()
+    provider = config["provider"]
+    model_name = config["model"]
+
+    if provider not in ("openai", "anthropic"):
+        return list(await asyncio.gather(*(
+            generate_clone_html(r["html"], r.get("css"), r.get("metadata")) for r in requests
+        )))
+
+    contexts = [
+        _build_context(provider, model_name, r["html"], r.get("css"), r.get("metadata"))
+        for r in requests
+    ]
 
-    client = AsyncOpenAI(api_key = OPENAI_API_KEY)
-    
     try:
-        response = await client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant for generating HTML clones."},
-                {"role": "user", "content": f"{instruction}\n\n{context}"}
-            ],
-            temperature=0.2,
-            max_tokens=160000  # Adjust based on expected output length
-        )
-        return response.choices[0].message.content.strip()
+        if provider == "openai":
+            outputs = await _batch_openai_api(model_name, _INSTRUCTION, contexts)
+        else:
+            outputs = await _batch_anthropic_api(model_name, _INSTRUCTION, contexts)
+    except Exception as e:
+        traceback.print_exc()
+        raise RuntimeError(f"Failed to generate batch clones with {provider}") from e
+
+    return [await asyncio.to_thread(_sanitize_and_validate_html, html) for html in outputs]
+
+
+async def generate_clones(items: List[Tuple[str, Optional[list], Optional[dict]]]) -> List[str]:
+    """
+    Clone several pages concurrently. Each item is the (scraped_html,
+    scraped_css_list, metadata) arguments of generate_clone_html; results are
+    returned in the same order. Wall time is that of the slowest clone rather
+    than the sum of all of them.
+    """
+    tasks = [asyncio.create_task(generate_clone_html(*item)) for item in items]
+    return list(await asyncio.gather(*tasks))
+
+
+async def clone_urls(urls: List[str]) -> List[str]:
+    """
+    Scrape and clone several URLs, pipelining each URL's scrape straight into its
+    LLM call so one page's generation overlaps the others' scraping.
+    """
+    async def scrape_and_clone(url: str) -> str:
+        result = await scrape_site(url)
+        if result["error"] is not None:
+            raise RuntimeError(f"Failed to scrape {url}: {result['error']}")
+        return await generate_clone_html(result["html"], result["css"], result["metadata"])
+
+    return list(await asyncio.gather(*(scrape_and_clone(url) for url in urls)))
+
+
+# Provider clients are created on first use and then shared across requests, so
+# the SDK's underlying HTTP connection pool (and its TLS sessions) is reused.
+# Those pools are bound to the event loop they first ran on, and
+# generate_clone_html_sync() starts a new loop on every call, so each client is
+# cached together with its loop and rebuilt when the running loop changes.
+_CLIENTS: Dict[str, Tuple[asyncio.AbstractEventLoop, object]] = {}
+
+
+def _loop_client(name: str, factory: Callable[[], T]) -> T:
+    """Return the cached client `name` for the running event loop, creating it if needed."""
+    loop = asyncio.get_running_loop()
+    entry = _CLIENTS.get(name)
+    if entry is None or entry[0] is not loop:
+        entry = (loop, factory())
+        _CLIENTS[name] = entry
+    return entry[1]
+
+
+def _get_anthropic_client() -> "anthropic.AsyncAnthropic":
+    def create():
+        import anthropic                # pip install anthropic
+        return anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    return _loop_client("anthropic", create)
+
+
+def _get_openai_client() -> "AsyncOpenAI":
+    def create():
+        from openai import AsyncOpenAI                  # pip install openai
+        return AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _loop_client("openai", create)
+
+
+def _get_gemini_client() -> "genai.Client":
+    def create():
+        from google import genai  # pip install google-genai
+        return genai.Client(api_key=GEMINI_API_KEY)
+    return _loop_client("google", create)
+
+
+async def _coalesced_completion(key: str, call: Callable[[], Awaitable[str]]) -> str:
+    """
+    Run `call` once per key at a time: concurrent requests for the same page await
+    the same in-flight provider call instead of each starting their own. The
+    result is stored in the completion cache.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        async def run() -> str:
+            result = await call()
+            _clone_cache.put(key, result)
+            return result
+
+        task = asyncio.ensure_future(run())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shielded so one caller being cancelled does not cancel the call others await
+    return await asyncio.shield(task)
+
+
+async def _complete(provider: str, model_name: str, instruction: str, context: str) -> str:
+    """Return a full completion, racing all configured providers if RACE_PROVIDERS is set."""
+    models = available_models()
+    if RACE_PROVIDERS and len(models) > 1:
+        return await _race_providers(models, instruction, context)
+    return await _call_provider(provider, model_name, instruction, context)
+
+
+async def _call_provider(provider: str, model_name: str, instruction: str, context: str) -> str:
+    """Call the given provider and return its complete response."""
+    if provider == "anthropic":
+        return await _call_anthropic_api(model_name, instruction, context)
+    elif provider == "openai":
+        return await _call_openai_api(model_name, instruction, context)
+    elif provider == "google":
+        return await _call_gemini_api(model_name, instruction, context)
+    else:
+        raise RuntimeError(f"Unsupported provider: {provider}")
+
+
+async def _race_providers(models: List[Dict[str, str]], instruction: str, context: str) -> str:
+    """
+    Call all the given providers concurrently and return the first successful
+    response. The remaining calls are cancelled; if every call fails, the
+    errors are reported together.
+    """
+    pending = {
+        asyncio.create_task(_call_provider(m["provider"], m["model"], instruction, context))
+        for m in models
+    }
+    errors = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+        raise RuntimeError(f"All providers failed: {'; '.join(str(e) for e in errors)}")
+    finally:
+        for task in pending:
+            task.cancel()
+        # Wait for the losers to finish cancelling, so their cleanup runs (and
+        # any errors are retrieved) before we return
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _stream_provider(provider: str, model_name: str, instruction: str, context: str) -> AsyncIterator[str]:
+    """Return the streaming generator for the given provider."""
+    if provider == "anthropic":
+        return _stream_anthropic_api(model_name, instruction, context)
+    elif provider == "openai":
+        return _stream_openai_api(model_name, instruction, context)
+    elif provider == "google":
+        return _stream_gemini_api(model_name, instruction, context)
+    else:
+        raise RuntimeError(f"Unsupported provider: {provider}")
+
+
+def _anthropic_params(model_name: str, instruction: str, context: str) -> dict:
+    """Request parameters shared by the streaming and batch Anthropic calls."""
+    return {
+        "model": model_name,
+        "max_tokens": _MAX_OUTPUT_TOKENS["anthropic"],
+        "temperature": 0.2,
+        "system": "You are a helpful assistant for generating HTML clones.",
+        "messages": [
+            {
+                "role": "user",
+                "content": instruction
+            },
+            {
+                "role": "user",
+                "content": context
+            },
+        ],
+    }
+
+
+def _openai_params(model_name: str, instruction: str, context: str) -> dict:
+    """Request parameters shared by the streaming and batch OpenAI calls."""
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant for generating HTML clones."},
+            {"role": "user", "content": f"{instruction}\n\n{context}"}
+        ],
+        "temperature": 0.2,
+        "max_tokens": _MAX_OUTPUT_TOKENS["openai"],
+    }
+
+
+async def _stream_anthropic_api(model_name: str, instruction: str, context: str) -> AsyncIterator[str]:
+    client = _get_anthropic_client()
+
+    async with client.messages.stream(**_anthropic_params(model_name, instruction, context)) as stream:
+        async for text in stream.text_stream:
+            yield text
+
+
+async def _stream_openai_api(model_name: str, instruction: str, context: str) -> AsyncIterator[str]:
+    client = _get_openai_client()
+
+    stream = await client.chat.completions.create(
+        **_openai_params(model_name, instruction, context),
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def _stream_gemini_api(model_name: str, instruction: str, context: str) -> AsyncIterator[str]:
+    from google.genai import types
+
+    client = _get_gemini_client()
+
+    # Use the client's async surface (client.aio); the sync generate_content_stream
+    # would block the event loop for the whole generation.
+    stream = await client.aio.models.generate_content_stream(
+        model=model_name,
+        config=types.GenerateContentConfig(
+            system_instruction=instruction),
+        contents=[context]
+    )
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+
+def _is_transient_error(exc: BaseException) -> bool:
+    """
+    True for rate-limit, overload and timeout errors from any provider SDK. Checked
+    by status code / class name because the SDKs are only imported lazily.
+    """
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if status in _TRANSIENT_STATUS_CODES:
+        return True
+    return type(exc).__name__ in _TRANSIENT_ERROR_NAMES
+
+
+async def _with_retries(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Await `call()`, retrying transient provider errors with jittered exponential
+    backoff (a random wait of up to 2**attempt seconds, capped at RETRY_MAX_WAIT).
+    """
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == RETRY_ATTEMPTS or not _is_transient_error(e):
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_WAIT, 2 ** attempt))
+            print(f"Transient LLM error ({e}); retrying in {delay:.1f}s (attempt {attempt}/{RETRY_ATTEMPTS})")
+            await asyncio.sleep(delay)
+
+
+def _join_stripped(parts: List[str]) -> str:
+    """
+    Equivalent to "".join(parts).strip(), but trims only the edge chunks so a
+    response with surrounding whitespace isn't copied a second time by strip().
+    """
+    start, end = 0, len(parts)
+    while start < end and not parts[start].strip():
+        start += 1
+    while end > start and not parts[end - 1].strip():
+        end -= 1
+    if start == end:
+        return ""
+    parts = parts[start:end]
+    parts[0] = parts[0].lstrip()
+    parts[-1] = parts[-1].rstrip()
+    return "".join(parts)
+
+
+async def _collect(stream: AsyncIterator[str]) -> str:
+    return _join_stripped([text async for text in stream])
+
+
+async def _call_anthropic_api(model_name: str, instruction: str, context: str) -> str:
+    try:
+        return await _with_retries(lambda: _collect(_stream_anthropic_api(model_name, instruction, context)))
     except Exception as e:
-        raise RuntimeError(f"OpenAI API error: {str(e)}")
+        raise RuntimeError(f"Anthropic API error: {str(e)}") from e
+
+
+async def _call_openai_api(model_name: str, instruction: str, context: str) -> str:
+    try:
+        return await _with_retries(lambda: _collect(_stream_openai_api(model_name, instruction, context)))
+    except Exception as e:
+        raise RuntimeError(f"OpenAI API error: {str(e)}") from e
 
 
 async def _call_gemini_api(model_name: str, instruction: str, context: str) -> str:
     """Call Google Gemini API."""
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    
     try:
-        response = client.models.generate_content(
-            model=model_name,
-            config=genai.types.GenerateContentConfig(
-                system_instruction=instruction),
-            contents=[context]
-        )
-        return response.text.strip()
+        return await _with_retries(lambda: _collect(_stream_gemini_api(model_name, instruction, context)))
     except Exception as e:
-        raise RuntimeError(f"Gemini API error: {str(e)}")
+        raise RuntimeError(f"Gemini API error: {str(e)}") from e
+
+
+async def _batch_openai_api(model_name: str, instruction: str, contexts: List[str]) -> List[str]:
+    """Submit one OpenAI batch job for all contexts and wait for its results."""
+    client = _get_openai_client()
+
+    lines = [
+        json.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _openai_params(model_name, instruction, context),
+        })
+        for i, context in enumerate(contexts)
+    ]
+    batch_file = await client.files.create(
+        file=("clone_batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"OpenAI batch {batch.id} ended with status {batch.status}")
+
+    outputs: Dict[int, str] = {}
+    result_file = await client.files.content(batch.output_file_id)
+    for line in result_file.text.splitlines():
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") == 200:
+            outputs[int(result["custom_id"])] = response["body"]["choices"][0]["message"]["content"].strip()
+
+    return _ordered_batch_outputs(outputs, len(contexts), "OpenAI")
+
+
+async def _batch_anthropic_api(model_name: str, instruction: str, contexts: List[str]) -> List[str]:
+    """Submit one Anthropic message batch for all contexts and wait for its results."""
+    client = _get_anthropic_client()
+
+    batch = await client.messages.batches.create(requests=[
+        {"custom_id": str(i), "params": _anthropic_params(model_name, instruction, context)}
+        for i, context in enumerate(contexts)
+    ])
+
+    while batch.processing_status != "ended":
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await client.messages.batches.retrieve(batch.id)
+
+    outputs: Dict[int, str] = {}
+    async for entry in await client.messages.batches.results(batch.id):
+        if entry.result.type == "succeeded":
+            outputs[int(entry.custom_id)] = entry.result.message.content[0].text.strip()
+
+    return _ordered_batch_outputs(outputs, len(contexts), "Anthropic")
+
+
+def _ordered_batch_outputs(outputs: Dict[int, str], count: int, provider_label: str) -> List[str]:
+    """Return batch outputs in request order, failing if any request did not succeed."""
+    missing = [i for i in range(count) if i not in outputs]
+    if missing:
+        raise RuntimeError(f"{provider_label} batch requests failed: {missing}")
+    return [outputs[i] for i in range(count)]
+
+
+# Used by the regex fallback when the output cannot be parsed. A plain lazy match
+# avoids the catastrophic backtracking of the nested-lookahead form on bad input.
+_SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.IGNORECASE | re.DOTALL)
+
+_DANGEROUS_ATTRS = ("onload", "onclick", "onerror", "onmouseover")
+# Matches every node the sanitizer has to touch, so one query finds them all
+_UNSAFE_NODES_SELECTOR = ", ".join(["script", *(f"[{attr}]" for attr in _DANGEROUS_ATTRS)])
 
 
 def _sanitize_and_validate_html(html_str: str) -> str:
@@ -250,21 +813,22 @@ def _sanitize_and_validate_html(html_str: str) -> str:
     - Optionally, run an HTML formatter or linter to catch unclosed tags.
     """
     try:
-        soup = BeautifulSoup(html_str, "html.parser")
-
-        # 1) Remove any script tags in case the model inserted them anyway
-        for script in soup.find_all("script"):
-            script.decompose()
-
-        # 2) Remove any potentially harmful attributes
-        dangerous_attrs = ['onload', 'onclick', 'onerror', 'onmouseover']
-        for tag in soup.find_all():
-            for attr in dangerous_attrs:
-                if tag.has_attr(attr):
-                    del tag[attr]
+        # Lexbor is a C HTML5 parser: much faster than a Python tree builder, and
+        # it keeps the case of SVG attributes such as viewBox
+        tree = LexborHTMLParser(html_str)
+
+        # 1) Remove any script tags in case the model inserted them anyway, and
+        # 2) any potentially harmful attributes
+        for node in tree.css(_UNSAFE_NODES_SELECTOR):
+            if node.tag == "script":
+                node.decompose()
+            else:
+                for attr in _DANGEROUS_ATTRS:
+                    if attr in node.attrs:
+                        del node.attrs[attr]
 
         # 3) Ensure a DOCTYPE (naïve check)
-        html_content = str(soup)
+        html_content = tree.html or ""
         if not html_content.lstrip().lower().startswith("<!doctype html>"):
             # Prepend a DOCTYPE
             html_content = "<!DOCTYPE html>\n" + html_content
@@ -272,9 +836,8 @@ def _sanitize_and_validate_html(html_str: str) -> str:
         return html_content
 
     except Exception as e:
-        # If BeautifulSoup fails, return original with basic script removal
-        import re
-        html_str = re.sub(r'<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>', '', html_str, flags=re.IGNORECASE)
+        # If the parser fails, return original with basic script removal
+        html_str = _SCRIPT_RE.sub('', html_str)
         
         if not html_str.lstrip().lower().startswith("<!doctype html>"):
             html_str = "<!DOCTYPE html>\n" + html_str
@@ -1,22 +1,360 @@
 from .event_loop_policy import *
-from fastapi import FastAPI, HTTPException
-from .scraper import scrape_site, PlaywrightScraper
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from .scraper import scrape_site, PlaywrightScraper, close_http_client
 from .llm import *
 from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+import asyncio
+import functools
+import hashlib
+import html as _html
+import json
+import logging
 import re
+from typing import AsyncIterator, Dict, Optional
 from .llm import _sanitize_and_validate_html
+from .cache import LRUCache
 
+# Logging setup. The per-request diagnostics (previews, element counts) are
+# DEBUG; switch the level to see them.
+logger = logging.getLogger("clone")
+logger.setLevel(logging.INFO)
+handler = logging.StreamHandler()
+formatter = logging.Formatter("[%(asctime)s] %(levelname)s — %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
 
-def keep_from_html(raw: str) -> str:
+# Parser used for every BeautifulSoup tree built here. lxml is C-backed and
+# several times faster than the pure-Python "html.parser".
+HTML_PARSER = "lxml"
+
+
+def _soup(markup: str) -> BeautifulSoup:
+    return BeautifulSoup(markup, HTML_PARSER)
+
+
+# The LLM output is only read and pruned, never built up, so it is parsed with
+# selectolax's Lexbor engine, which is much faster than BeautifulSoup for that.
+# BeautifulSoup stays for the fallback builders that pick the original apart.
+def _tree(markup: str) -> LexborHTMLParser:
+    return LexborHTMLParser(markup)
+
+
+# Regexes used on every request, compiled once at import.
+# One `property: value` declaration; extract_colors_from_css walks these in a single pass
+_CSS_DECL_RE = re.compile(r'(?P<prop>[\w-]+)\s*:\s*(?P<value>[^;{}\n]+)')
+_GRADIENT_RE = re.compile(r'(?:linear|radial|conic)-gradient\([^)]+\)', re.IGNORECASE)
+_HEX_RE = re.compile(r'#([0-9a-fA-F]{3,6})')
+# Declarations whose value names a color slot; CSS variables with "color" in the name go to 'primary'
+_COLOR_PROPS = {'background': 'background', 'background-color': 'background', 'color': 'text', 'border-color': 'accent'}
+_FONT_FAMILY_RE = re.compile(r'font-family:\s*([^;]+)', re.IGNORECASE)
+# Cookie/privacy/terms boilerplate skipped by the fallback, matched without lowercasing a copy
+_LEGAL_PREFIX_RE = re.compile(r'cookie|privacy|terms', re.IGNORECASE)
+# Prompt trimming for _compact_for_llm
+_WHITESPACE_RE = re.compile(r'\s+')
+# Quoted data: URIs may contain ")" (e.g. rgb() inside an SVG), so they run to the
+# closing quote, skipping backslash escapes. Written as an unrolled loop so
+# megabyte-long base64 URIs are scanned in runs instead of one char at a time.
+_CSS_DATA_URI_RE = re.compile(
+    r"""url\(\s*(?:(["'])data:[^\\\n"']*(?:(?:\\.|(?!\1)["'])[^\\\n"']*)*\1|data:[^)]*)\s*\)""",
+    re.IGNORECASE,
+)
+# Everything remove_animations_from_css drops, as one alternation so the CSS is scanned once:
+# animation/transition declarations, motion transforms and @keyframes blocks
+_CSS_MOTION_RE = re.compile(
+    r'animation[^;]*;'
+    r'|transition[^;]*;'
+    r'|transform:\s*(?:translate|rotate|scale)[^;]*;'
+    r'|@keyframes[^{]*\{[^}]*\}',
+    re.IGNORECASE,
+)
+
+# Tags pruned from the LLM output before validation; nothing inside them is shown
+_NON_RENDERED_TAGS = ['script', 'noscript', 'template']
+_NON_RENDERED_SELECTOR = ', '.join(_NON_RENDERED_TAGS)
+# Tags that count as visible content when judging whether a body is empty
+_MEANINGFUL_TAGS = frozenset(('p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'div', 'span', 'img', 'a', 'button', 'nav', 'main', 'section', 'article'))
+
+
+# Page skeletons for the fallback/emergency builders, filled with str.format.
+# The fallback page is split around the original CSS and the content blocks,
+# which are spliced in as-is.
+_FALLBACK_PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>
+        /* Original CSS preserved */
+        """
+
+_FALLBACK_PAGE_BODY = """
+        
+        /* Enhancements for extracted content display */
+        body {{
+            font-family: {primary_font};
+            background-color: {background_color};
+            color: {text_color};
+            margin: 0;
+            padding: 20px;
+            line-height: 1.6;
+        }}
+        .fallback-container {{
+            max-width: 1200px;
+            margin: 0 auto;
+            background: {background_color};
+            border-radius: 8px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+            overflow: hidden;
+        }}
+        .fallback-header {{
+            background: {primary_color};
+            color: white;
+            padding: 20px;
+            text-align: center;
+        }}
+        .fallback-content {{
+            padding: 20px;
+        }}
+        .main-content, .extracted-text, .nav-content, .extracted-chunk, .list-content {{
+            margin-bottom: 15px;
+            padding: 15px;
+            border-left: 3px solid {accent_color};
+            background: rgba(0,0,0,0.02);
+            border-radius: 4px;
+        }}
+        .extracted-heading {{
+            color: {primary_color};
+            margin: 20px 0 10px 0;
+        }}
+        .image-container {{
+            margin: 15px 0;
+            text-align: center;
+            background: rgba(0,0,0,0.02);
+            padding: 15px;
+            border-radius: 4px;
+        }}
+        .fallback-notice {{
+            background: rgba(33, 150, 243, 0.1);
+            border: 1px solid {accent_color};
+            border-radius: 5px;
+            padding: 15px;
+            margin-bottom: 20px;
+        }}
+        .stats {{
+            display: flex;
+            justify-content: space-around;
+            background: rgba(0,0,0,0.02);
+            padding: 15px;
+            margin: 20px 0;
+            border-radius: 4px;
+            flex-wrap: wrap;
+        }}
+        .stat {{
+            text-align: center;
+            margin: 5px;
+        }}
+        .nav-content {{
+            background: rgba(255, 193, 7, 0.1);
+            border-left-color: {accent_color};
+        }}
+    </style>
+</head>
+<body>
+    <div class="fallback-container">
+        <div class="fallback-header">
+            <h1>📄 {title}</h1>
+            <p>Static Clone - Original Styling Preserved</p>
+        </div>
+        
+        <div class="fallback-content">
+            <div class="fallback-notice">
+                <h3>🔄 Content Extracted with Original Styling</h3>
+                <p>This fallback preserves the original website's colors, fonts, and styling while displaying the extracted content:</p>
+            </div>
+            
+            <div class="stats">
+                <div class="stat">
+                    <strong>{blocks}</strong><br>
+                    <small>Content Blocks</small>
+                </div>
+                <div class="stat">
+                    <strong>{image_count}</strong><br>
+                    <small>Images Found</small>
+                </div>
+                <div class="stat">
+                    <strong>{css_files}</strong><br>
+                    <small>CSS Files</small>
+                </div>
+                <div class="stat">
+                    <strong>{word_count}</strong><br>
+                    <small>Total Words</small>
+                </div>
+            </div>
+            
+            <div class="extracted-content">
+                """
+
+_FALLBACK_EMPTY_CONTENT = "<div class='main-content'><h2>⚠️ Limited Content Extracted</h2><p>Could not extract substantial content from {title}. This appears to be a heavily JavaScript-dependent website that requires dynamic rendering to display content.</p><p>The original page likely loads content after initial page load, making it difficult to extract in a static format.</p></div>"
+
+_FALLBACK_PAGE_TAIL = """
+            </div>
+        </div>
+    </div>
+</body>
+</html>"""
+
+_EMERGENCY_PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>
+        body {{
+            font-family: {primary_font};
+            background-color: {background_color};
+            color: {text_color};
+            margin: 0;
+            padding: 20px;
+            line-height: 1.6;
+        }}
+        .container {{
+            max-width: 1200px;
+            margin: 0 auto;
+            background: {background_color};
+            border-radius: 8px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+            overflow: hidden;
+        }}
+        .header {{
+            background: {primary_color};
+            color: white;
+            padding: 30px;
+            text-align: center;
+        }}
+        .content {{
+            padding: 30px;
+        }}
+        h1, h2, h3 {{
+            color: {primary_color};
+        }}
+        .emergency-notice {{
+            background: rgba(255, 193, 7, 0.1);
+            border: 2px solid #ffc107;
+            border-radius: 8px;
+            padding: 20px;
+            margin-bottom: 30px;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🌟 {title}</h1>
+            <p>Static Website Clone - Enhanced Content Generation</p>
+        </div>
+        
+        <div class="content">
+            <div class="emergency-notice">
+                <h3 style="margin-top: 0; color: #856404;">🚀 Enhanced Content Generation</h3>
+                <p style="margin-bottom: 0;">This page was created using advanced content extraction and generation techniques to provide you with a meaningful representation of the original website, complete with substantial content and proper styling.</p>
+            </div>
+            
+            """
+
+_EMERGENCY_PAGE_TAIL = """
+            
+            <footer style="margin-top: 40px; padding-top: 20px; border-top: 2px solid {primary_color}; text-align: center; color: #666;">
+                <p>Static clone generated with original website styling and content preservation</p>
+            </footer>
+        </div>
+    </div>
+</body>
+</html>"""
+
+
+def _bucket(root, groups: Dict[str, tuple]) -> Dict[str, list]:
+    """
+    Walk `root` once and collect its descendant tags into named groups.
+    Each group keeps document order, like a `find_all` over its tag names.
+    """
+    by_tag: Dict[str, list] = {}
+    for group, tags in groups.items():
+        for tag in tags:
+            by_tag.setdefault(tag, []).append(group)
+    buckets = {group: [] for group in groups}
+    for el in root.descendants:
+        for group in by_tag.get(getattr(el, 'name', None), ()):
+            buckets[group].append(el)
+    return buckets
+
+
+def _text(el, texts: Optional[dict]) -> str:
+    """
+    `el.get_text(strip=True)`, memoized in `texts` by id(el) when a cache is given.
+    Only share a cache between callers that hold the same tree alive.
+    """
+    if texts is None:
+        return el.get_text(strip=True)
+    text = texts.get(id(el))
+    if text is None:
+        text = texts[id(el)] = el.get_text(strip=True)
+    return text
+
+
+def _node_text(node, texts: Optional[dict] = None) -> str:
+    """
+    Lexbor counterpart of `_text`: the node's stripped text without <style>
+    contents, matching what bs4's get_text(strip=True) counts. Memoized by
+    mem_id, since selectolax hands out a new wrapper object on every access.
+    """
+    key = node.mem_id
+    if texts is not None and key in texts:
+        return texts[key]
+    if node.css_first('style') is None:
+        text = node.text(strip=True)
+    else:
+        text = ''.join(
+            child.text_content.strip()
+            for child in node.traverse(include_text=True)
+            if child.tag == '-text' and child.parent.tag != 'style'
+        )
+    if texts is not None:
+        texts[key] = text
+    return text
+
+
+def _visible(body, texts: Optional[dict] = None) -> tuple:
+    """
+    Meaningful elements under `body`, and those that render something:
+    non-empty text, images or buttons.
+    """
+    elements = [node for node in body.traverse() if node.tag in _MEANINGFUL_TAGS]
+    visible = [node for node in elements if node.tag in ('img', 'button') or _node_text(node, texts)]
+    return elements, visible
+
+
+def keep_from_html(raw: str, tree: Optional[LexborHTMLParser] = None, modified: bool = True) -> str:
     """
     Extract the HTML content while preserving the entire document structure.
     Returns the full HTML document if valid, otherwise returns the original string.
+    Pass `tree` if `raw` has already been parsed to skip re-parsing it, and
+    `modified=False` if that tree still matches `raw`: a complete document
+    (doctype plus <html>) is then returned as is, without re-serializing.
     """
+    if not modified:
+        document = raw.lstrip()
+        if document[:15].lower() == "<!doctype html>" and "<html" in document[:2048].lower():
+            return document
     try:
-        soup = BeautifulSoup(raw, 'html.parser')
-        if not soup.find('html'):
+        if tree is None:
+            tree = _tree(raw)
+        if tree.css_first('html') is None:
             return raw
-        return str(soup)
+        return tree.html
     except Exception:
         return raw
 
@@ -55,10 +393,20 @@ async def clone_website(payload: dict):
     }
 
 
-# This is the main endpoint for cloning a website and it is used by the frontend
+# This is the main endpoint for cloning a website and it is used by the frontend.
+# It answers with a single JSON object by default; clients that send
+# `Accept: text/event-stream` get the LLM output as Server-Sent Events instead.
 @app.post("/api/clone/stream")
-async def clone_stream(payload: dict):
+async def clone_stream(payload: dict, request: Request):
     url = payload["url"]
+
+    # The provider list is fixed at import, so this is a constant-time check;
+    # run it before scraping so a server without LLM keys fails fast
+    try:
+        choose_model()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
     result = await scrape_site(url)
 
     if result["error"] is not None:
@@ -69,72 +417,214 @@ async def clone_stream(payload: dict):
     images = result["images"]
     metadata = result["metadata"]
 
-    model_config = choose_model()
-    provider, model_name = model_config["provider"], model_config["model"]
+    # The fallback inputs depend only on the scraped page, so build them
+    # in a worker thread while the LLM request is in flight. Skip them when
+    # this page's fallback is already cached; the builders then build them
+    # on demand if the emergency page turns out to be needed.
+    digest = await asyncio.to_thread(_page_digest, html, css)
+    prep_task = None
+    if _page_cache.get(_page_key("create_fallback_html", digest, metadata)) is None:
+        prep_task = asyncio.ensure_future(asyncio.to_thread(_prepare_fallback_bits, html, css, digest))
+    try:
+        # The LLM only sees a trimmed copy; the fallbacks keep the full page
+        llm_html, llm_css = await asyncio.to_thread(_compact_for_llm, html, css)
+    except Exception as e:
+        await _discard_task(prep_task)
+        logger.error(f"Page compaction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Preparing the scraped page failed: {e}")
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        # From here on the event stream owns prep_task
+        return StreamingResponse(
+            _clone_events(html, css, images, metadata, prep_task, llm_html, llm_css),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
+    # prep_task keeps running in its thread while the LLM request is in flight
     try:
-        clone_raw_html = await generate_clone_html(scraped_html=html, scraped_css_list=css, metadata=metadata)
-        
-        # Debug: Log the raw LLM output
-        print(f"Raw LLM output length: {len(clone_raw_html)}")
-        print(f"Raw LLM output starts with: {clone_raw_html[:100]}")
-        
-        clone_html = strip_markdown_code_blocks(clone_raw_html)
-        
-        # Debug: Log after markdown stripping
-        print(f"After markdown stripping length: {len(clone_html)}")
-        print(f"After markdown stripping starts with: {clone_html[:100]}")
-        
-        # Content verification and regeneration attempt
-        clone_html = verify_and_fix_content(clone_html, html, css, metadata)
-        
-        clone_html = _sanitize_and_validate_html(clone_html)
-        
-        # Check if the body is empty and create fallback if needed
-        soup = BeautifulSoup(clone_html, 'html.parser')
-        body = soup.find('body')
-        if body and len(body.get_text(strip=True)) < 50:
-            print("⚠️ LLM returned empty body, creating fallback...")
-            # Create a fallback using the original scraped content
-            clone_html = create_fallback_html(html, css, metadata)
-        
-        html_only = keep_from_html(clone_html)
-        
-        # Ensure we have a valid HTML document
-        if not html_only.strip().startswith("<!DOCTYPE html>"):
-            html_only = "<!DOCTYPE html>\n" + html_only
-        
-        # Final validation - ensure the HTML actually has meaningful content
-        final_soup = BeautifulSoup(html_only, 'html.parser')
-        final_body = final_soup.find('body')
-        if final_body:
-            final_text = final_body.get_text(strip=True)
-            final_elements = final_body.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'div', 'span', 'img', 'a', 'button', 'nav', 'main', 'section', 'article'])
-            final_visible = [elem for elem in final_elements if elem.get_text(strip=True) or elem.name in ['img', 'button']]
-            
-            print(f"Final body validation - text length: {len(final_text)}")
-            print(f"Final body validation - visible elements: {len(final_visible)}")
-            print(f"Final body preview: {final_text[:300]}")
-            
-            # If we still don't have enough content, create emergency content
-            if len(final_text) < 100 and len(final_visible) < 10:
-                print("🚨 FINAL EMERGENCY FALLBACK: Creating substantial emergency content")
-                html_only = create_emergency_content(html, css, metadata)
-        
-        return {
-            "clone_html": html_only,
+        # Raw output, like the streamed chunks: _finalize_clone strips the
+        # markdown fence before its one sanitize pass
+        clone_raw_html = await complete_clone_html(scraped_html=llm_html, scraped_css_list=llm_css, metadata=metadata)
+    except Exception as e:
+        await _discard_task(prep_task)
+        logger.error(f"LLM generation error: {e}")
+        raise HTTPException(status_code=500, detail=f"LLM generation failed: {e}")
+
+    try:
+        prep = await prep_task if prep_task is not None else None
+        clone_html = await asyncio.to_thread(_finalize_clone, clone_raw_html, html, css, metadata, prep)
+    except Exception as e:
+        logger.error(f"Clone post-processing error: {e}")
+        raise HTTPException(status_code=500, detail=f"Post-processing the clone failed: {e}")
+
+    return {
+        "clone_html": clone_html,
+        "images": images,
+        "metadata": metadata,
+        "original_css": css  # Include original CSS for reference
+    }
+
+
+def _compact_for_llm(html: str, css_list: list) -> tuple:
+    """
+    Shrink the scraped page before it is put in the prompt: drop scripts,
+    <noscript> and <style> blocks (the scraper already returns their CSS in
+    `css_list`), collapse whitespace, blank out inline `data:` URIs in the CSS
+    and drop duplicate stylesheets.
+    """
+    soup = _soup(html)
+    for tag in soup(['script', 'style', 'noscript']):
+        tag.decompose()
+    compact_html = _WHITESPACE_RE.sub(' ', str(soup))
+
+    compact_css = [_CSS_DATA_URI_RE.sub('url()', sheet) for sheet in css_list or ()]
+    compact_css = list(dict.fromkeys(compact_css))
+
+    logger.info(f"Compacted LLM input: HTML {len(html)} -> {len(compact_html)} chars, "
+                f"CSS {sum(map(len, css_list or ()))} -> {sum(map(len, compact_css))} chars")
+    return compact_html, compact_css
+
+
+async def _discard_task(task: Optional[asyncio.Future]) -> None:
+    """Cancel a background task and wait for it, so its outcome is always retrieved."""
+    if task is None:
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def _sse(event: str, data) -> str:
+    """Frame one Server-Sent Event; data is JSON-encoded so newlines stay on one line."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _clone_events(
+    html: str,
+    css: list,
+    images: list,
+    metadata: dict,
+    prep_task,
+    llm_html: str,
+    llm_css: list,
+) -> AsyncIterator[str]:
+    """
+    Relay LLM chunks as `chunk` events while they arrive, then post-process the
+    joined output and send the same payload as the JSON response in a `done` event.
+    """
+    parts = []
+    try:
+        # Headers are already sent, so failures are reported in-band
+        try:
+            async for chunk in stream_clone_html(scraped_html=llm_html, scraped_css_list=llm_css, metadata=metadata):
+                parts.append(chunk)
+                yield _sse("chunk", chunk)
+        except Exception as e:
+            logger.error(f"LLM generation error: {e}")
+            yield _sse("error", {"detail": f"LLM generation failed: {e}"})
+            return
+
+        try:
+            prep = await prep_task if prep_task is not None else None
+            clone_html = await asyncio.to_thread(_finalize_clone, "".join(parts), html, css, metadata, prep)
+        except Exception as e:
+            logger.error(f"Clone post-processing error: {e}")
+            yield _sse("error", {"detail": f"Post-processing the clone failed: {e}"})
+            return
+
+        yield _sse("done", {
+            "clone_html": clone_html,
             "images": images,
             "metadata": metadata,
             "original_css": css  # Include original CSS for reference
-        }
-    except Exception as e:
-        print(f"LLM generation error: {e}")
-        raise HTTPException(status_code=500, detail=f"LLM generation failed: {e}")
+        })
+    finally:
+        await _discard_task(prep_task)
+
+
+def _finalize_clone(clone_raw_html: str, html: str, css: list, metadata: dict, prep: Optional[dict]) -> str:
+    """
+    Turn raw LLM output into the final page: strip markdown, sanitize, verify the
+    content and fall back to the scraped page when the clone comes back empty.
+    All of it is CPU-bound, so the endpoints run it in a worker thread.
+    """
+    # Debug: Log the raw LLM output
+    logger.debug(f"Raw LLM output length: {len(clone_raw_html)}")
+    logger.debug(f"Raw LLM output starts with: {clone_raw_html[:100]}")
+    
+    clone_html = strip_markdown_code_blocks(clone_raw_html)
+    
+    # Debug: Log after markdown stripping
+    logger.debug(f"After markdown stripping length: {len(clone_html)}")
+    logger.debug(f"After markdown stripping starts with: {clone_html[:100]}")
+    
+    clone_html = _sanitize_and_validate_html(clone_html)
+    
+    # Parse once; the tree is reused by every check below and only rebuilt
+    # when a fallback replaces the HTML wholesale. Element texts are cached
+    # alongside the tree and dropped with it.
+    tree = _tree(clone_html)
+    texts = {}
+    
+    # Prune what never renders before any text is counted, so it can neither
+    # pad the length checks nor cost a walk. <style> stays: the page needs it,
+    # and _node_text() already skips stylesheet text. Track whether the tree
+    # still matches clone_html, so the output can skip re-serializing it.
+    modified = tree.css_first(_NON_RENDERED_SELECTOR) is not None
+    if modified:
+        tree.strip_tags(_NON_RENDERED_TAGS)
+    
+    # Content verification and regeneration attempt
+    verified_html = verify_and_fix_content(clone_html, html, css, metadata, tree=tree, prep=prep, texts=texts)
+    if verified_html is not clone_html:
+        clone_html = verified_html
+        tree = _tree(clone_html)
+        texts = {}
+        modified = False
+    
+    # Check if the body is empty and create fallback if needed
+    body = tree.body
+    if body and len(_node_text(body, texts)) < 50:
+        logger.warning("⚠️ LLM returned empty body, creating fallback...")
+        # Create a fallback using the original scraped content
+        clone_html = create_fallback_html(html, css, metadata, prep=prep)
+        tree = _tree(clone_html)
+        texts = {}
+        modified = False
+    
+    html_only = keep_from_html(clone_html, tree=tree, modified=modified)
+    
+    # Ensure we have a valid HTML document
+    if html_only.lstrip()[:15].lower() != "<!doctype html>":
+        html_only = "<!DOCTYPE html>\n" + html_only
+    
+    # Final validation - ensure the HTML actually has meaningful content
+    final_body = tree.body
+    if final_body:
+        final_text = _node_text(final_body, texts)
+        _, final_visible = _visible(final_body, texts)
+        
+        logger.debug(f"Final body validation - text length: {len(final_text)}")
+        logger.debug(f"Final body validation - visible elements: {len(final_visible)}")
+        logger.debug(f"Final body preview: {final_text[:300]}")
+        
+        # If we still don't have enough content, create emergency content
+        if len(final_text) < 100 and len(final_visible) < 10:
+            logger.warning("🚨 FINAL EMERGENCY FALLBACK: Creating substantial emergency content")
+            html_only = create_emergency_content(html, css, metadata, prep=prep)
+    
+    return html_only
     
 
+@app.on_event("startup")
+async def startup_event():
+    # Pay the Chromium launch once here instead of on the first scrape
+    await PlaywrightScraper.startup()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     await PlaywrightScraper.close()
+    await close_http_client()
 
 def strip_markdown_code_blocks(text: str) -> str:
     """
@@ -146,30 +636,99 @@ def strip_markdown_code_blocks(text: str) -> str:
     # Remove leading/trailing whitespace
     text = text.strip()
     
-    # Try multiple patterns to catch different markdown formats
-    patterns = [
-        r"^```html\s*([\s\S]*?)\s*```$",  # ```html ... ```
-        r"^```\s*([\s\S]*?)\s*```$",     # ``` ... ```
-        r"^`{3,}\w*\s*([\s\S]*?)\s*`{3,}$",  # Multiple backticks
-    ]
-    
-    for pattern in patterns:
-        match = re.match(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            extracted = match.group(1).strip()
-            print(f"Stripped markdown code block, extracted {len(extracted)} characters")
+    # A fence (```, ```html, ````lang, ...) must open and close the whole
+    # response, so check both ends and slice instead of regex-scanning it
+    if text.startswith('```') and text.endswith('```'):
+        start = len(text) - len(text.lstrip('`'))
+        end = len(text.rstrip('`'))
+        if end > start:
+            # Skip the language tag after the opening backticks
+            while start < end and (text[start].isalnum() or text[start] == '_'):
+                start += 1
+            extracted = text[start:end].strip()
+            logger.debug(f"Stripped markdown code block, extracted {len(extracted)} characters")
             return extracted
     
     # If no markdown found, return original
-    print("No markdown code block found")
+    logger.debug("No markdown code block found")
     return text
 
-def create_fallback_html(original_html: str, css_list: list, metadata: dict) -> str:
+def _prepare_fallback_bits(original_html: str, css_list: list, digest: Optional[str] = None) -> dict:
+    """
+    Do the work the fallback/emergency pages need from the scraped page up front:
+    parse the original HTML, extract colors and fonts, and strip animations.
+    Pass `digest` if the caller already has the page's _page_digest.
+    """
+    # Join the stylesheets once; every extractor below scans the same string
+    combined_css = "\n".join(css_list) if css_list else ""
+    return {
+        'soup': _soup(original_html),
+        'colors': extract_colors_from_css(combined_css),
+        'fonts': extract_fonts_from_css(combined_css),
+        'css': remove_animations_from_css(combined_css) if combined_css else "",
+        # get_text(strip=True) results for elements of 'soup', shared by the
+        # fallback and emergency builders
+        'texts': {},
+        # Cache key for the finished pages (see _memoized_page)
+        'digest': digest or _page_digest(original_html, css_list),
+    }
+
+
+# Fallback/emergency pages are pure functions of the scraped page, so repeat
+# clones of the same site (common while testing) reuse the finished page.
+# Each page embeds the site's full CSS, so the cache is capped by size too.
+PAGE_CACHE_MAX_ENTRIES = 64
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_CACHE_TTL = 600  # seconds
+_page_cache: "LRUCache[str]" = LRUCache(PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_TTL)
+
+
+def _page_digest(original_html: str, css_list: list) -> str:
+    h = hashlib.blake2b(original_html.encode(), digest_size=16)
+    for sheet in css_list or ():
+        h.update(b"\0")
+        h.update(sheet.encode())
+    return h.hexdigest()
+
+
+def _page_key(builder_name: str, digest: str, metadata: dict) -> tuple:
+    return (builder_name, digest, json.dumps(metadata, sort_keys=True, default=str))
+
+
+def _memoized_page(builder):
+    """Cache a page builder's output by (builder, page digest, metadata)."""
+    @functools.wraps(builder)
+    def wrapper(original_html: str, css_list: list, metadata: dict, prep: Optional[dict] = None) -> str:
+        digest = prep['digest'] if prep is not None else _page_digest(original_html, css_list)
+        key = _page_key(builder.__name__, digest, metadata)
+        page = _page_cache.get(key)
+        if page is None:
+            page = builder(original_html, css_list, metadata, prep=prep)
+            _page_cache.put(key, page)
+        return page
+    return wrapper
+
+
+@_memoized_page
+def create_fallback_html(original_html: str, css_list: list, metadata: dict, prep: Optional[dict] = None) -> str:
     """
     Create a fallback HTML page that preserves original styling and branding.
     Extracts colors, fonts, and styling from the original website.
+    Pass `prep` from `_prepare_fallback_bits` to reuse work already done.
     """
-    soup = BeautifulSoup(original_html, 'html.parser')
+    if prep is None:
+        prep = _prepare_fallback_bits(original_html, css_list)
+    soup = prep['soup']
+    texts = prep['texts']
+    # One walk over the original tree feeds every extraction step below
+    found = _bucket(soup, {
+        'main': ('main', 'article'),
+        'nav': ('nav', 'header'),
+        'headings': ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'),
+        'text': ('p', 'div', 'span', 'section'),
+        'lists': ('ul', 'ol'),
+        'img': ('img',),
+    })
     
     # Extract title and basic metadata
     title = metadata.get('title', 'Cloned Website') if metadata else 'Cloned Website'
@@ -179,72 +738,66 @@ def create_fallback_html(original_html: str, css_list: list, metadata: dict) ->
     content_elements = []
     
     # 1. Look for main content areas (common across all sites)
-    main_areas = soup.find_all(['main', 'article', '[role="main"]', '#main', '.main', '.content', '#content'])
-    for area in main_areas[:3]:  # Limit to first 3 main areas
-        area_text = area.get_text(strip=True)
+    for area in found['main'][:3]:  # Limit to first 3 main areas
+        area_text = _text(area, texts)
         if len(area_text) > 50:
-            content_elements.append(f'<div class="main-content">{area_text[:500]}...</div>')
+            content_elements.append(f'<div class="main-content">{_html.escape(area_text[:500])}...</div>')
     
     # 2. Look for navigation elements (universal)
-    nav_elements = soup.find_all(['nav', 'header', '[role="navigation"]', '.nav', '.navbar', '.menu'])
-    for nav in nav_elements[:2]:  # Limit to first 2 nav elements
-        nav_text = nav.get_text(strip=True)
+    for nav in found['nav'][:2]:  # Limit to first 2 nav elements
+        nav_text = _text(nav, texts)
         if len(nav_text) > 10 and len(nav_text) < 200:  # Reasonable nav size
-            content_elements.append(f'<div class="nav-content"><strong>Navigation:</strong> {nav_text}</div>')
+            content_elements.append(f'<div class="nav-content"><strong>Navigation:</strong> {_html.escape(nav_text)}</div>')
     
     # 3. Look for headings (universal content indicators)
-    headings = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-    for heading in headings[:8]:  # Limit to first 8 headings
-        heading_text = heading.get_text(strip=True)
+    for heading in found['headings'][:8]:  # Limit to first 8 headings
+        heading_text = _text(heading, texts)
         if len(heading_text) > 3 and len(heading_text) < 100:
             level = heading.name
-            content_elements.append(f'<{level} class="extracted-heading">{heading_text}</{level}>')
+            content_elements.append(f'<{level} class="extracted-heading">{_html.escape(heading_text)}</{level}>')
     
     # 4. Look for substantial paragraphs and text blocks
-    text_elements = soup.find_all(['p', 'div', 'span', 'section'])
     added_text = set()
-    for elem in text_elements[:15]:  # Limit to first 15 text elements
-        text_content = elem.get_text(strip=True)
-        if (len(text_content) > 30 and 
-            len(text_content) < 300 and 
+    for elem in found['text'][:15]:  # Limit to first 15 text elements
+        text_content = _text(elem, texts)
+        if (30 < len(text_content) < 300 and
             text_content not in added_text and
-            not text_content.lower().startswith(('cookie', 'privacy', 'terms'))):  # Skip legal text
+            not _LEGAL_PREFIX_RE.match(text_content)):  # Skip legal text
             added_text.add(text_content)
-            content_elements.append(f'<p class="extracted-text">{text_content}</p>')
+            content_elements.append(f'<p class="extracted-text">{_html.escape(text_content)}</p>')
     
     # 5. Look for lists (common content structure)
-    lists = soup.find_all(['ul', 'ol'])
-    for list_elem in lists[:3]:  # Limit to first 3 lists
-        list_text = list_elem.get_text(strip=True)
+    for list_elem in found['lists'][:3]:  # Limit to first 3 lists
+        list_text = _text(list_elem, texts)
         if len(list_text) > 20 and len(list_text) < 200:
-            content_elements.append(f'<div class="list-content">{str(list_elem)}</div>')
+            content_elements.append(f'<div class="list-content">{list_elem.decode()}</div>')
     
     # 6. Look for images with alt text or captions
-    images = soup.find_all('img')
+    images = found['img']
     image_count = 0
     for img in images:
         if img.get('src') and image_count < 5:  # Limit to first 5 images
-            alt_text = img.get('alt', 'Image')
-            src = img.get('src')
+            alt_text = _html.escape(img.get('alt', 'Image'))
+            src = _html.escape(img.get('src'))
             content_elements.append(f'<div class="image-container"><img src="{src}" alt="{alt_text}" style="max-width: 100%; height: auto;"><p><em>{alt_text}</em></p></div>')
             image_count += 1
     
     # 7. If we still don't have much content, extract visible text in chunks
     if len(content_elements) < 5:
-        all_text = soup.get_text(strip=True)
+        all_text = _text(soup, texts)
         words = all_text.split()
         if len(words) > 100:
             # Take meaningful chunks of text
             for i in range(0, min(len(words), 400), 80):
                 chunk = ' '.join(words[i:i+80])
                 if len(chunk.strip()) > 50:
-                    content_elements.append(f'<p class="extracted-chunk">{chunk}</p>')
+                    content_elements.append(f'<p class="extracted-chunk">{_html.escape(chunk)}</p>')
                 if len(content_elements) >= 8:  # Don't overwhelm with too much content
                     break
     
     # Extract original styling from CSS
-    original_colors = extract_colors_from_css(css_list)
-    original_fonts = extract_fonts_from_css(css_list)
+    original_colors = prep['colors']
+    original_fonts = prep['fonts']
     
     # Use extracted colors or fallback to colors found in HTML
     primary_color = original_colors.get('primary', '#007bff')
@@ -256,209 +809,97 @@ def create_fallback_html(original_html: str, css_list: list, metadata: dict) ->
     primary_font = original_fonts.get('primary', '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Arial, sans-serif')
     
     # Include original CSS with modifications for static display
-    combined_css = ""
-    if css_list:
-        combined_css = "\n".join(css_list)
-        # Remove animations and transitions for static version
-        combined_css = remove_animations_from_css(combined_css)
-    
-    # CSS that uses original styling but ensures content is visible
-    enhanced_css = f"""
-        /* Original CSS preserved */
-        {combined_css}
-        
-        /* Enhancements for extracted content display */
-        body {{
-            font-family: {primary_font};
-            background-color: {background_color};
-            color: {text_color};
-            margin: 0;
-            padding: 20px;
-            line-height: 1.6;
-        }}
-        .fallback-container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: {background_color};
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            overflow: hidden;
-        }}
-        .fallback-header {{
-            background: {primary_color};
-            color: white;
-            padding: 20px;
-            text-align: center;
-        }}
-        .fallback-content {{
-            padding: 20px;
-        }}
-        .main-content, .extracted-text, .nav-content, .extracted-chunk, .list-content {{
-            margin-bottom: 15px;
-            padding: 15px;
-            border-left: 3px solid {accent_color};
-            background: rgba(0,0,0,0.02);
-            border-radius: 4px;
-        }}
-        .extracted-heading {{
-            color: {primary_color};
-            margin: 20px 0 10px 0;
-        }}
-        .image-container {{
-            margin: 15px 0;
-            text-align: center;
-            background: rgba(0,0,0,0.02);
-            padding: 15px;
-            border-radius: 4px;
-        }}
-        .fallback-notice {{
-            background: rgba(33, 150, 243, 0.1);
-            border: 1px solid {accent_color};
-            border-radius: 5px;
-            padding: 15px;
-            margin-bottom: 20px;
-        }}
-        .stats {{
-            display: flex;
-            justify-content: space-around;
-            background: rgba(0,0,0,0.02);
-            padding: 15px;
-            margin: 20px 0;
-            border-radius: 4px;
-            flex-wrap: wrap;
-        }}
-        .stat {{
-            text-align: center;
-            margin: 5px;
-        }}
-        .nav-content {{
-            background: rgba(255, 193, 7, 0.1);
-            border-left-color: {accent_color};
-        }}
-    """
+    # (animations and transitions already removed for the static version)
+    combined_css = prep['css']
     
-    # Create fallback HTML that preserves original branding
-    fallback_html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <style>{enhanced_css}</style>
-</head>
-<body>
-    <div class="fallback-container">
-        <div class="fallback-header">
-            <h1>📄 {title}</h1>
-            <p>Static Clone - Original Styling Preserved</p>
-        </div>
-        
-        <div class="fallback-content">
-            <div class="fallback-notice">
-                <h3>🔄 Content Extracted with Original Styling</h3>
-                <p>This fallback preserves the original website's colors, fonts, and styling while displaying the extracted content:</p>
-            </div>
-            
-            <div class="stats">
-                <div class="stat">
-                    <strong>{len(content_elements)}</strong><br>
-                    <small>Content Blocks</small>
-                </div>
-                <div class="stat">
-                    <strong>{len(images)}</strong><br>
-                    <small>Images Found</small>
-                </div>
-                <div class="stat">
-                    <strong>{len(css_list)}</strong><br>
-                    <small>CSS Files</small>
-                </div>
-                <div class="stat">
-                    <strong>{len(soup.get_text().split())}</strong><br>
-                    <small>Total Words</small>
-                </div>
-            </div>
-            
-            <div class="extracted-content">
-                {"".join(content_elements) if content_elements else f"<div class='main-content'><h2>⚠️ Limited Content Extracted</h2><p>Could not extract substantial content from {title}. This appears to be a heavily JavaScript-dependent website that requires dynamic rendering to display content.</p><p>The original page likely loads content after initial page load, making it difficult to extract in a static format.</p></div>"}
-            </div>
-        </div>
-    </div>
-</body>
-</html>"""
-    
-    return fallback_html
+    # The page is emitted as a list of pieces joined once, so the (possibly
+    # large) original CSS and the content blocks are copied a single time
+    values = {
+        'title': _html.escape(title),
+        'primary_color': primary_color,
+        'background_color': background_color,
+        'text_color': text_color,
+        'accent_color': accent_color,
+        'primary_font': primary_font,
+        'blocks': len(content_elements),
+        'image_count': len(images),
+        'css_files': len(css_list),
+        'word_count': len(soup.get_text().split()),
+    }
+    parts = [_FALLBACK_PAGE_HEAD.format(**values), combined_css, _FALLBACK_PAGE_BODY.format(**values)]
+    if content_elements:
+        parts.extend(content_elements)
+    else:
+        parts.append(_FALLBACK_EMPTY_CONTENT.format(**values))
+    parts.append(_FALLBACK_PAGE_TAIL)
+    # Lists are copied over as scraped markup and the CSS is the site's own,
+    # so the page goes through the same sanitizer as the LLM output
+    return _sanitize_and_validate_html("".join(parts))
 
-def extract_colors_from_css(css_list: list) -> dict:
-    """Extract colors from CSS to preserve original color scheme with enhanced gradient support."""
+def extract_colors_from_css(combined_css: str) -> dict:
+    """Extract colors from the joined CSS to preserve original color scheme with enhanced gradient support."""
     colors = {'primary': '#007bff', 'background': '#ffffff', 'text': '#333333', 'accent': '#007bff'}
     
-    if not css_list:
+    if not combined_css:
         return colors
     
-    combined_css = ' '.join(css_list)
-    
-    # Look for gradient patterns specifically
-    gradient_patterns = [
-        r'linear-gradient\([^)]+\)',
-        r'radial-gradient\([^)]+\)',
-        r'conic-gradient\([^)]+\)',
-    ]
-    
-    gradients = []
-    for pattern in gradient_patterns:
-        found_gradients = re.findall(pattern, combined_css, re.IGNORECASE)
-        gradients.extend(found_gradients)
-    
-    # If we find gradients, extract the first gradient as the primary background
-    if gradients:
-        colors['background'] = gradients[0]
-        print(f"Found gradient background: {gradients[0]}")
-    
-    # Look for common color patterns
-    hex_colors = re.findall(r'#([0-9a-fA-F]{3,6})', combined_css)
-    rgb_colors = re.findall(r'rgb\([^)]+\)', combined_css)
-    rgba_colors = re.findall(r'rgba\([^)]+\)', combined_css)
-    
-    # Enhanced color context detection
-    color_contexts = [
-        (r'background(?:-color)?:\s*([^;}\n]+)', 'background'),
-        (r'color:\s*([^;}\n]+)', 'text'),
-        (r'border-color:\s*([^;}\n]+)', 'accent'),
-        (r'--[\w-]*color[\w-]*:\s*([^;}\n]+)', 'primary'),  # CSS variables with "color" in name
-    ]
-    
-    for pattern, color_type in color_contexts:
-        matches = re.findall(pattern, combined_css, re.IGNORECASE)
-        if matches:
-            for match in matches:
-                color_value = match.strip()
-                if color_value and not color_value.startswith('var(') and not color_value == 'inherit':
-                    colors[color_type] = color_value
-                    break  # Use first valid match
+    # Walk the declarations once, keeping the first usable value for each slot
+    found = {}
+    gradient = None
+    first_hex = long_hex = None
+    for decl in _CSS_DECL_RE.finditer(combined_css):
+        prop = decl.group('prop').lower()
+        value = decl.group('value').strip()
+        
+        if prop.startswith('--'):
+            color_type = 'primary' if 'color' in prop else None
+        else:
+            color_type = _COLOR_PROPS.get(prop)
+        if (color_type and color_type not in found and value and
+                not value.startswith('var(') and value != 'inherit'):
+            found[color_type] = value
+        
+        if gradient is None:
+            match = _GRADIENT_RE.search(value)
+            if match:
+                gradient = match.group(0)
+        
+        if long_hex is None:
+            for hex_color in _HEX_RE.findall(value):
+                if first_hex is None:
+                    first_hex = hex_color
+                # Prefer longer hex codes (6 digits over 3)
+                if len(hex_color) == 6:
+                    long_hex = hex_color
+                    break
+        
+        # Stop as soon as every slot is settled
+        if long_hex is not None and gradient is not None and len(found) == 4:
+            break
+    
+    # If we find gradients, use the first one as the background unless a
+    # background declaration names a color explicitly
+    if gradient:
+        colors['background'] = gradient
+        logger.debug(f"Found gradient background: {gradient}")
+    colors.update(found)
     
     # Set primary color to the most vibrant/distinct color found
-    if hex_colors:
-        # Prefer longer hex codes (6 digits over 3)
-        long_hex = [c for c in hex_colors if len(c) == 6]
-        if long_hex:
-            colors['primary'] = f"#{long_hex[0]}"
-        else:
-            colors['primary'] = f"#{hex_colors[0]}"
+    if long_hex or first_hex:
+        colors['primary'] = f"#{long_hex or first_hex}"
     
     return colors
 
 
-def extract_fonts_from_css(css_list: list) -> dict:
-    """Extract font families from CSS to preserve original typography."""
+def extract_fonts_from_css(combined_css: str) -> dict:
+    """Extract font families from the joined CSS to preserve original typography."""
     fonts = {'primary': '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Arial, sans-serif'}
     
-    if not css_list:
+    if not combined_css:
         return fonts
     
-    combined_css = ' '.join(css_list)
-    
     # Look for font-family declarations
-    font_matches = re.findall(r'font-family:\s*([^;]+)', combined_css, re.IGNORECASE)
+    font_matches = _FONT_FAMILY_RE.findall(combined_css)
     if font_matches:
         # Use the first non-variable font family found
         for font in font_matches:
@@ -472,16 +913,10 @@ def extract_fonts_from_css(css_list: list) -> dict:
 
 def remove_animations_from_css(css: str) -> str:
     """Remove animations and transitions from CSS for static display while preserving gradients and visual effects."""
-    # Remove animation properties but preserve transforms that affect layout
-    css = re.sub(r'animation[^;]*;', '', css, flags=re.IGNORECASE)
-    css = re.sub(r'transition[^;]*;', '', css, flags=re.IGNORECASE)
-    
-    # Only remove transforms that are clearly animation-related (translate, rotate, scale with transitions)
-    # Keep static transforms that affect layout
-    css = re.sub(r'transform:\s*(?:translate|rotate|scale)[^;]*;', '', css, flags=re.IGNORECASE)
-    
-    # Remove keyframes entirely
-    css = re.sub(r'@keyframes[^{]*\{[^}]*\}', '', css, flags=re.IGNORECASE | re.DOTALL)
+    # Remove animation/transition properties and keyframes entirely, plus transforms
+    # that are clearly animation-related (translate, rotate, scale); static
+    # transforms that affect layout are kept
+    css = _CSS_MOTION_RE.sub('', css)
     
     # Preserve background gradients explicitly (ensure they don't get accidentally removed)
     # Add comments to mark preserved gradients
@@ -490,65 +925,85 @@ def remove_animations_from_css(css: str) -> str:
     
     return css
 
-def verify_and_fix_content(clone_html: str, original_html: str, css_list: list, metadata: dict) -> str:
+def verify_and_fix_content(
+    clone_html: str,
+    original_html: str,
+    css_list: list,
+    metadata: dict,
+    tree: Optional[LexborHTMLParser] = None,
+    prep: Optional[dict] = None,
+    texts: Optional[dict] = None,
+) -> str:
     """
     Verify that the cloned HTML has substantial content and fix if needed.
+    Pass `tree` if `clone_html` has already been parsed to skip re-parsing it,
+    and `prep` to hand precomputed inputs to the fallback. `texts` caches
+    element texts for the caller's later checks on the same `tree`.
     """
-    # Check body content BEFORE sanitization
-    soup_check = BeautifulSoup(clone_html, 'html.parser')
-    body_check = soup_check.find('body')
+    tree_check = tree if tree is not None else _tree(clone_html)
+    body_check = tree_check.body
     
     if not body_check:
-        print("❌ NO BODY TAG FOUND!")
-        return create_fallback_html(original_html, css_list, metadata)
+        logger.warning("❌ NO BODY TAG FOUND!")
+        return create_fallback_html(original_html, css_list, metadata, prep=prep)
     
-    body_text = body_check.get_text(strip=True)
-    body_html_content = str(body_check)
+    body_text = _node_text(body_check, texts)
     
-    print(f"Body text length: {len(body_text)}")
-    print(f"Body HTML length: {len(body_html_content)}")
-    print(f"Body content preview: {body_text[:200]}")
-    print(f"Body HTML preview: {body_html_content[:500]}")
+    logger.debug(f"Body text length: {len(body_text)}")
+    logger.debug(f"Body content preview: {body_text[:200]}")
+    # Serializing the body is only needed for these lines, so skip it unless shown
+    if logger.isEnabledFor(logging.DEBUG):
+        body_html_content = body_check.html
+        logger.debug(f"Body HTML length: {len(body_html_content)}")
+        logger.debug(f"Body HTML preview: {body_html_content[:500]}")
     
     # Count meaningful elements in body
-    meaningful_elements = body_check.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'div', 'span', 'img', 'a', 'button', 'nav', 'main', 'section', 'article'])
-    visible_elements = [elem for elem in meaningful_elements if elem.get_text(strip=True) or elem.name in ['img', 'button']]
+    meaningful_elements, visible_elements = _visible(body_check, texts)
     
-    print(f"Total elements in body: {len(meaningful_elements)}")
-    print(f"Elements with visible content: {len(visible_elements)}")
+    logger.debug(f"Total elements in body: {len(meaningful_elements)}")
+    logger.debug(f"Elements with visible content: {len(visible_elements)}")
     
     # More aggressive content checking
     has_sufficient_text = len(body_text) >= 100
     has_sufficient_elements = len(visible_elements) >= 10
-    has_navigation = bool(body_check.find(['nav', 'header']))
-    has_main_content = bool(body_check.find(['main', 'article', '[role="main"]']))
+    has_navigation = body_check.css_first('nav, header') is not None
+    has_main_content = body_check.css_first('main, article') is not None
     
-    print(f"Content checks:")
-    print(f"  - Sufficient text ({len(body_text)} >= 100): {has_sufficient_text}")
-    print(f"  - Sufficient elements ({len(visible_elements)} >= 10): {has_sufficient_elements}")
-    print(f"  - Has navigation: {has_navigation}")
-    print(f"  - Has main content: {has_main_content}")
+    logger.debug("Content checks:")
+    logger.debug(f"  - Sufficient text ({len(body_text)} >= 100): {has_sufficient_text}")
+    logger.debug(f"  - Sufficient elements ({len(visible_elements)} >= 10): {has_sufficient_elements}")
+    logger.debug(f"  - Has navigation: {has_navigation}")
+    logger.debug(f"  - Has main content: {has_main_content}")
     
     # If content is insufficient, use fallback
     if not (has_sufficient_text or (has_sufficient_elements and (has_navigation or has_main_content))):
-        print("🚨 FORCING FALLBACK: Body has insufficient content")
-        print(f"Reason: Text {len(body_text)} < 100 AND (elements {len(visible_elements)} < 10 OR missing nav/main)")
-        return create_fallback_html(original_html, css_list, metadata)
+        logger.warning("🚨 FORCING FALLBACK: Body has insufficient content")
+        logger.warning(f"Reason: Text {len(body_text)} < 100 AND (elements {len(visible_elements)} < 10 OR missing nav/main)")
+        return create_fallback_html(original_html, css_list, metadata, prep=prep)
     
-    print("✅ Content verification passed")
+    logger.info("✅ Content verification passed")
     return clone_html
 
-def create_emergency_content(original_html: str, css_list: list, metadata: dict) -> str:
+@_memoized_page
+def create_emergency_content(original_html: str, css_list: list, metadata: dict, prep: Optional[dict] = None) -> str:
     """
     Create emergency content when all other methods fail.
     This creates a more substantial page with recreated content.
     """
-    soup = BeautifulSoup(original_html, 'html.parser')
+    if prep is None:
+        prep = _prepare_fallback_bits(original_html, css_list)
+    soup = prep['soup']
+    texts = prep['texts']
+    found = _bucket(soup, {
+        'nav': ('nav', 'header'),
+        'headings': ('h1', 'h2', 'h3'),
+        'img': ('img',),
+    })
     title = metadata.get('title', 'Website Clone') if metadata else 'Website Clone'
     
     # Extract original styling
-    original_colors = extract_colors_from_css(css_list)
-    original_fonts = extract_fonts_from_css(css_list)
+    original_colors = prep['colors']
+    original_fonts = prep['fonts']
     
     primary_color = original_colors.get('primary', '#007bff')
     background_color = original_colors.get('background', '#ffffff')
@@ -563,105 +1018,45 @@ def create_emergency_content(original_html: str, css_list: list, metadata: dict)
     content_sections = []
     
     # Add navigation-like content
-    nav_elements = soup.find_all(['nav', 'header', '[role="navigation"]'])
-    nav_text = ' '.join([elem.get_text(strip=True) for elem in nav_elements[:2]])
+    nav_text = ' '.join([_text(elem, texts) for elem in found['nav'][:2]])
     if nav_text:
-        content_sections.append(f'<nav style="background: {primary_color}; color: white; padding: 15px; margin-bottom: 20px; border-radius: 4px;"><h3 style="margin: 0; color: white;">Navigation</h3><p style="margin: 5px 0 0 0; color: rgba(255,255,255,0.9);">{nav_text[:200]}...</p></nav>')
+        content_sections.append(f'<nav style="background: {primary_color}; color: white; padding: 15px; margin-bottom: 20px; border-radius: 4px;"><h3 style="margin: 0; color: white;">Navigation</h3><p style="margin: 5px 0 0 0; color: rgba(255,255,255,0.9);">{_html.escape(nav_text[:200])}...</p></nav>')
     
     # Add main content sections
-    headings = soup.find_all(['h1', 'h2', 'h3'])
-    for i, heading in enumerate(headings[:5]):
-        heading_text = heading.get_text(strip=True)
+    for i, heading in enumerate(found['headings'][:5]):
+        heading_text = _text(heading, texts)
         if heading_text and len(heading_text) > 3:
-            content_sections.append(f'<section style="margin: 20px 0; padding: 20px; border-left: 4px solid {primary_color}; background: rgba(0,0,0,0.02);"><h2 style="color: {primary_color}; margin-top: 0;">{heading_text}</h2><p>Content section extracted from the original website.</p></section>')
+            content_sections.append(f'<section style="margin: 20px 0; padding: 20px; border-left: 4px solid {primary_color}; background: rgba(0,0,0,0.02);"><h2 style="color: {primary_color}; margin-top: 0;">{_html.escape(heading_text)}</h2><p>Content section extracted from the original website.</p></section>')
     
     # Add text content in chunks
     if len(words) > 50:
         for i in range(0, min(len(words), 300), 60):
             chunk = ' '.join(words[i:i+60])
             if chunk.strip():
-                content_sections.append(f'<div style="margin: 15px 0; padding: 15px; background: rgba(0,0,0,0.02); border-radius: 4px;"><p>{chunk}</p></div>')
+                content_sections.append(f'<div style="margin: 15px 0; padding: 15px; background: rgba(0,0,0,0.02); border-radius: 4px;"><p>{_html.escape(chunk)}</p></div>')
     
     # Add images
-    images = soup.find_all('img')
-    for img in images[:3]:
+    for img in found['img'][:3]:
         if img.get('src'):
-            alt_text = img.get('alt', 'Image from original site')
-            src = img.get('src')
+            alt_text = _html.escape(img.get('alt', 'Image from original site'))
+            src = _html.escape(img.get('src'))
             content_sections.append(f'<div style="margin: 20px 0; text-align: center; padding: 15px; background: rgba(0,0,0,0.02); border-radius: 4px;"><img src="{src}" alt="{alt_text}" style="max-width: 100%; height: auto; border-radius: 4px;"><p style="margin: 10px 0 0 0; font-style: italic; color: #666;">{alt_text}</p></div>')
     
     # Ensure we have enough content
     while len(content_sections) < 8:
         content_sections.append(f'<div style="margin: 15px 0; padding: 15px; background: rgba(0,0,0,0.02); border-radius: 4px;"><h3 style="color: {primary_color}; margin-top: 0;">Website Section</h3><p>This section represents content from the original website. The AI extracted this information to create a meaningful static representation.</p></div>')
     
-    emergency_html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <style>
-        body {{
-            font-family: {primary_font};
-            background-color: {background_color};
-            color: {text_color};
-            margin: 0;
-            padding: 20px;
-            line-height: 1.6;
-        }}
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: {background_color};
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            overflow: hidden;
-        }}
-        .header {{
-            background: {primary_color};
-            color: white;
-            padding: 30px;
-            text-align: center;
-        }}
-        .content {{
-            padding: 30px;
-        }}
-        h1, h2, h3 {{
-            color: {primary_color};
-        }}
-        .emergency-notice {{
-            background: rgba(255, 193, 7, 0.1);
-            border: 2px solid #ffc107;
-            border-radius: 8px;
-            padding: 20px;
-            margin-bottom: 30px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🌟 {title}</h1>
-            <p>Static Website Clone - Enhanced Content Generation</p>
-        </div>
-        
-        <div class="content">
-            <div class="emergency-notice">
-                <h3 style="margin-top: 0; color: #856404;">🚀 Enhanced Content Generation</h3>
-                <p style="margin-bottom: 0;">This page was created using advanced content extraction and generation techniques to provide you with a meaningful representation of the original website, complete with substantial content and proper styling.</p>
-            </div>
-            
-            {"".join(content_sections)}
-            
-            <footer style="margin-top: 40px; padding-top: 20px; border-top: 2px solid {primary_color}; text-align: center; color: #666;">
-                <p>Static clone generated with original website styling and content preservation</p>
-            </footer>
-        </div>
-    </div>
-</body>
-</html>"""
-    
-    return emergency_html
+    values = {
+        'title': _html.escape(title),
+        'primary_color': primary_color,
+        'background_color': background_color,
+        'text_color': text_color,
+        'primary_font': primary_font,
+    }
+    # Colors and fonts come straight from the site's CSS; sanitize like the fallback page
+    return _sanitize_and_validate_html(
+        "".join([_EMERGENCY_PAGE_HEAD.format(**values), *content_sections, _EMERGENCY_PAGE_TAIL.format(**values)])
+    )
 
 if __name__ == "__main__":
     import uvicorn
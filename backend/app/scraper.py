@@ -1,17 +1,20 @@
 # scraper.py
 import asyncio
+import itertools
 import logging
 import random
 import re
-import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from urllib.parse import urljoin, urlparse
 
-import requests
+import httpx
 from bs4 import BeautifulSoup
 from bs4.element import Tag
+from selectolax.lexbor import LexborHTMLParser, LexborNode
 from playwright.async_api import Browser, BrowserContext, Page, async_playwright
 
+from .cache import LRUCache
+
 # ───────────────────────────────────────────────────────────────────────────────
 # CONSTANTS AND CONFIGURATION
 # ───────────────────────────────────────────────────────────────────────────────
@@ -39,10 +42,67 @@ USER_AGENTS = [
 # Default timeout (in seconds) for HTTP requests and Playwright navigation.
 REQUEST_TIMEOUT = 10
 PLAYWRIGHT_TIMEOUT = 30000  # milliseconds
-
-# Minimal delay between requests to mimic human browsing
-MIN_DELAY = 0.5  # seconds
-MAX_DELAY = 1.5  # seconds
+LAZY_CONTENT_TIMEOUT = 5000  # milliseconds to wait for lazy images after scrolling
+
+# Number of pre-warmed Playwright pages kept ready for headless fetches, and
+# how long a fetch waits for one before giving up.
+PAGE_POOL_SIZE = 4
+PAGE_POOL_WAIT_TIMEOUT = 60  # seconds
+
+# Upper bounds on downloaded bodies; anything larger is treated as a failed fetch.
+MAX_HTML_BYTES = 5 * 1024 * 1024
+MAX_CSS_BYTES = 2 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Stylesheets are fetched concurrently; cap how many hit the same host at once.
+CSS_FETCHES_PER_HOST = 4
+
+# LRU+TTL cache of downloaded stylesheets, so scraping several pages of the
+# same site doesn't re-download its shared CSS every time. A single sheet may be
+# up to MAX_CSS_BYTES, so the total size is capped as well as the count.
+CSS_CACHE_MAX_ENTRIES = 512
+CSS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CSS_CACHE_TTL = 300  # seconds
+
+# Headers sent with every static fetch; the User-Agent is picked once per scrape.
+DEFAULT_HEADERS = {
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+}
+
+# Connection limits for the shared HTTP client.
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+
+# HTTP/2 lets concurrent stylesheet fetches share one connection per host;
+# it needs the optional `h2` package, so fall back to HTTP/1.1 without it.
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# BeautifulSoup parser: lxml is C-backed and several times faster than the
+# pure-Python "html.parser"; fall back to the latter if lxml isn't installed.
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Compiled once: these run over every stylesheet and style attribute.
+_URL_RE = re.compile(r'url\(\s*(?P<q>[\'"]?)(?P<u>[^\'")]+)(?P=q)\s*\)')
+
+# url() targets left untouched: already absolute, data URIs and fragment refs.
+_ABSOLUTE_URL_PREFIXES = ('http://', 'https://', '//', 'data:', '#')
+_BG_URL_RE = re.compile(r"background(?:-image)?:\s*url\(([^)]+)\)", re.IGNORECASE)
+_CSS_MARKER_RE = re.compile(r"gradient|background-image|@keyframes", re.IGNORECASE)
+
+# Elements that likely hold the site's logo.
+LOGO_SELECTOR = 'img[alt*="logo"], img[src*="logo"], .logo img, #logo img, svg[class*="logo"]'
+
+# Every element _extract_metadata looks at, matched in a single tree walk.
+METADATA_SELECTOR = f"title, meta, nav, header, main, section, article, {LOGO_SELECTOR}"
 
 # Logging setup
 logger = logging.getLogger("scraper")
@@ -52,36 +112,102 @@ formatter = logging.Formatter("[%(asctime)s] %(levelname)s — %(message)s")
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# One shared async client for the page and its stylesheets, so fetches never
+# block the event loop and reuse keep-alive connections instead of paying a
+# TCP+TLS handshake per request. Built lazily by _get_http_client() and closed
+# by close_http_client() on shutdown.
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+
+# The User-Agent pool in a random order, handed out round-robin.
+_UA_CYCLE = itertools.cycle(random.sample(USER_AGENTS, len(USER_AGENTS)))
 
 
-def _random_user_agent() -> str:
+def _next_user_agent() -> str:
+    """
+    Return the next User-Agent from our small (shuffled) pool.
+    Helps circumvent very basic bot-detection rules. A scrape picks one and
+    uses it for every request it makes, like a real browser would.
+    """
+    return next(_UA_CYCLE)
+
+
+def _check_content_length(headers, max_bytes: int) -> None:
+    """
+    Raise ValueError if the response declares a body larger than max_bytes.
+    """
+    declared = headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise ValueError(f"response is {declared} bytes, over the {max_bytes} byte limit")
+
+
+async def _read_capped(resp: httpx.Response, max_bytes: int) -> str:
+    """
+    Read a streamed response, giving up once it exceeds max_bytes, so an
+    oversized page never gets fully buffered.
+    """
+    _check_content_length(resp.headers, max_bytes)
+    body = bytearray()
+    async for chunk in resp.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        body += chunk
+        if len(body) > max_bytes:
+            raise ValueError(f"response exceeded the {max_bytes} byte limit")
+    return body.decode(resp.encoding or "utf-8", errors="replace")
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client, building a new one if there is none yet, it
+    was closed (a previous app lifespan), or it belongs to another event loop
+    (its pooled connections can't be used from this one).
+    """
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            headers=DEFAULT_HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client():
     """
-    Return a random User-Agent from our small pool.
-    Helps circumvent very basic bot-detection rules.
+    Close the shared HTTP client (e.g. from a FastAPI shutdown event). The next
+    fetch builds a new one.
     """
-    return random.choice(USER_AGENTS)
+    global _http_client, _http_client_loop
+    client, _http_client, _http_client_loop = _http_client, None, None
+    if client is not None:
+        await client.aclose()
 
 
-def _fetch_static_html(url: str) -> Optional[str]:
+async def _fetch_static_html(url: str, user_agent: str) -> Optional[BeautifulSoup]:
     """
     Try a simple HTTP GET + BeautifulSoup approach to fetch the page's raw HTML.
-    Returns the HTML string if status is 200 and content looks non-empty;
-    otherwise returns None to signal fallback to headless approach.
+    Returns the parsed soup if status is 200 and content looks non-empty, so the
+    rest of the pipeline can reuse it; otherwise returns None to signal fallback
+    to headless approach.
     """
-    headers = {
-        "User-Agent": _random_user_agent(),
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    }
+    headers = {"User-Agent": user_agent}
 
     try:
         logger.info(f"Attempting static fetch for {url}")
-        resp = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()  # Raises an HTTPError for 4xx/5xx
-        raw_html = resp.text
+        async with _get_http_client().stream("GET", url, headers=headers) as resp:
+            resp.raise_for_status()  # Raises an HTTPStatusError for 4xx/5xx
+            raw_html = await _read_capped(resp, MAX_HTML_BYTES)
 
         # Parse the HTML
-        soup = BeautifulSoup(raw_html, "html.parser")
+        soup = BeautifulSoup(raw_html, HTML_PARSER)
         
         # Ensure we have a proper HTML structure
         if not soup.find('html'):
@@ -102,22 +228,66 @@ def _fetch_static_html(url: str) -> Optional[str]:
 
         # If we got here, we have valid content
         logger.info("Successfully fetched static HTML content")
-        return raw_html
+        return soup
 
     except Exception as e:
         logger.warning(f"Static fetch failed ({e}); will try headless. URL: {url}")
         return None
 
 
-def _inline_css_and_collect(html: str, base_url: str) -> (str, List[str]):
+_css_cache: "LRUCache[str]" = LRUCache(CSS_CACHE_MAX_ENTRIES, CSS_CACHE_MAX_BYTES, CSS_CACHE_TTL)
+
+
+async def _fetch_css(
+    full_url: str,
+    base_url: str,
+    user_agent: str,
+    host_limits: Dict[str, asyncio.Semaphore],
+) -> Optional[str]:
+    """
+    Fetch one stylesheet and return its processed CSS, or None if it failed.
+    """
+    css_content = _css_cache.get(full_url)
+    if css_content is not None:
+        return _process_modern_css(css_content, base_url)
+
+    host = urlparse(full_url).netloc
+    limit = host_limits.setdefault(host, asyncio.Semaphore(CSS_FETCHES_PER_HOST))
+    try:
+        async with limit:
+            logger.info(f"Fetching CSS: {full_url}")
+            async with _get_http_client().stream(
+                "GET", full_url, headers={"User-Agent": user_agent}
+            ) as css_resp:
+                css_resp.raise_for_status()
+                css_content = await _read_capped(css_resp, MAX_CSS_BYTES)
+    except Exception as e:
+        logger.warning(f"Failed to fetch CSS at {full_url}: {e}")
+        return None
+    _css_cache.put(full_url, css_content)
+
+    # Enhanced CSS processing to preserve modern features
+    return _process_modern_css(css_content, base_url)
+
+
+async def _inline_css_and_collect(
+    soup: BeautifulSoup,
+    base_url: str,
+    user_agent: str,
+    loaded_css: Optional[Dict[str, str]] = None,
+) -> List[str]:
     """
-    Given raw HTML and a base_url, find all <link rel="stylesheet"> tags,
+    Given the parsed page and a base_url, find all <link rel="stylesheet"> tags,
     fetch each stylesheet's content, then inline them by replacing the tag
-    with a <style> block. Returns a tuple (inlined_html, css_contents_list).
+    with a <style> block. The soup is modified in place; returns the list of
+    CSS contents.
+
+    Stylesheets are fetched concurrently (a few at a time per host) and spliced
+    back in document order. Those found in `loaded_css` (absolute URL -> CSS
+    text, as already loaded by the headless browser) aren't fetched again.
 
     Enhanced to preserve CSS variables, media queries, and modern CSS features.
     """
-    soup = BeautifulSoup(html, "html.parser")
     css_texts: List[str] = []
 
     # Extract any existing CSS variables from style tags first
@@ -129,36 +299,36 @@ def _inline_css_and_collect(html: str, base_url: str) -> (str, List[str]):
             css_texts.append(style_content)
 
     # Process all stylesheets
-    link_tags = soup.find_all("link", {"rel": "stylesheet"})
-    for link in link_tags:
-        href = link.get("href")
-        if not href:
+    links = [
+        (link, urljoin(base_url, link.get("href")))
+        for link in soup.find_all("link", {"rel": "stylesheet"})
+        if link.get("href")
+    ]
+    if not links:
+        return css_texts
+
+    loaded_css = loaded_css or {}
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def resolve(full_url: str) -> Optional[str]:
+        if full_url in loaded_css:
+            return _process_modern_css(loaded_css[full_url], base_url)
+        return await _fetch_css(full_url, base_url, user_agent, host_limits)
+
+    results = await asyncio.gather(*(resolve(full_url) for _, full_url in links))
+
+    for (link, _), processed_css in zip(links, results):
+        if processed_css is None:
             continue
-        full_url = urljoin(base_url, href)
-        try:
-            logger.info(f"Fetching CSS: {full_url}")
-            css_resp = requests.get(full_url, headers={"User-Agent": _random_user_agent()}, timeout=REQUEST_TIMEOUT)
-            css_resp.raise_for_status()
-            css_content = css_resp.text
-            
-            # Enhanced CSS processing to preserve modern features
-            processed_css = _process_modern_css(css_content, base_url)
-            css_texts.append(processed_css)
+        css_texts.append(processed_css)
 
-            # Replace <link> tag with <style> containing the processed CSS
-            style_tag = soup.new_tag("style")
-            style_tag.string = processed_css
-            link.replace_with(style_tag)
+        # Replace <link> tag with <style> containing the processed CSS
+        style_tag = soup.new_tag("style")
+        style_tag.string = processed_css
+        link.replace_with(style_tag)
 
-            # Pause briefly between requests to be polite
-            time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))
-
-        except Exception as e:
-            logger.warning(f"Failed to fetch CSS at {full_url}: {e}")
-            continue
-
-    # Return the modified HTML (with inlined CSS) and the list of raw CSS
-    return str(soup), css_texts
+    # The soup now carries the inlined CSS; return the list of raw CSS
+    return css_texts
 
 
 def _process_modern_css(css_content: str, base_url: str) -> str:
@@ -167,133 +337,150 @@ def _process_modern_css(css_content: str, base_url: str) -> str:
     """
     # 1. Make relative URLs in CSS absolute
     def make_url_absolute(match):
-        url = match.group(1).strip('\'"')
-        if url.startswith(('http://', 'https://', '//', 'data:')):
-            return match.group(0)  # Already absolute or data URL
+        url = match.group("u").strip()
+        if url.startswith(_ABSOLUTE_URL_PREFIXES):
+            return match.group(0)  # Already absolute, data URL or fragment
         absolute_url = urljoin(base_url, url)
-        quote_char = '"' if '"' in match.group(0) else "'"
+        quote_char = match.group("q") or "'"
         return f"url({quote_char}{absolute_url}{quote_char})"
     
     # Process url() references
-    css_content = re.sub(r'url\([\'"]?([^\'")]+)[\'"]?\)', make_url_absolute, css_content)
+    css_content = _URL_RE.sub(make_url_absolute, css_content)
     
     # 2. Preserve CSS features that are important for visual fidelity
     # Ensure we don't accidentally remove important CSS constructs
     
     # 3. Add high-priority markers for critical visual styles
-    if 'gradient' in css_content.lower():
+    # (one scan finds which of the three constructs appear at all)
+    found = {m.lower() for m in _CSS_MARKER_RE.findall(css_content)}
+    if 'gradient' in found:
         css_content = '/* Contains gradients - preserve exactly */\n' + css_content
     
-    if 'background-image' in css_content.lower():
+    if 'background-image' in found:
         css_content = '/* Contains background images - preserve exactly */\n' + css_content
         
-    if '@keyframes' in css_content.lower():
+    if '@keyframes' in found:
         css_content = '/* Contains animations - may be removed for static version */\n' + css_content
     
     return css_content
 
 
-def _extract_image_urls(html: str, base_url: str) -> List[str]:
+def _extract_image_urls(tree: LexborHTMLParser, base_url: str) -> List[str]:
     """
-    Scan the inlined or original HTML for <img> tags and CSS background images.
+    Scan the inlined or original page for <img> tags and CSS background images.
     Returns a list of absolute URLs to all discovered images.
     We only collect URLs here; we do not download them. The clone can hot-link.
     """
-    soup = BeautifulSoup(html, "html.parser")
     image_urls: List[str] = []
+    # Deduplicate as we go, on both the raw reference (to skip re-resolving it)
+    # and the absolute URL (different references can resolve to the same image)
+    seen_raw: Set[str] = set()
+    seen: Set[str] = set()
+
+    def add(raw: str):
+        if raw in seen_raw:
+            return
+        seen_raw.add(raw)
+        full = urljoin(base_url, raw)
+        if full not in seen:
+            seen.add(full)
+            image_urls.append(full)
 
     # 1) <img> tags
-    for img in soup.find_all("img"):
-        src = img.get("src") or img.get("data-src")
-        if not src:
-            continue
-        full_src = urljoin(base_url, src)
-        image_urls.append(full_src)
+    for img in tree.css("img"):
+        src = img.attributes.get("src") or img.attributes.get("data-src")
+        if src:
+            add(src)
 
     # 2) Inline CSS background-image in style attributes
-    for tag in soup.find_all(style=True):
-        style = tag.get("style")
-        # look for background-image: url(...)
-        matches = re.findall(r"background(?:-image)?:\s*url\(([^)]+)\)", style, re.IGNORECASE)
-        for m in matches:
-            # strip quotes if any
-            m_clean = m.strip('"\' ')
-            full_img = urljoin(base_url, m_clean)
-            image_urls.append(full_img)
+    for tag in tree.css("[style]"):
+        style = tag.attributes.get("style") or ""
+        # look for background-image: url(...), stripping quotes if any
+        for m in _BG_URL_RE.findall(style):
+            add(m.strip('"\' '))
 
     # 3) <style> tags with CSS background-image declarations
-    for style_tag in soup.find_all("style"):
-        css_text = style_tag.get_text() or ""
-        matches = re.findall(r"background(?:-image)?:\s*url\(([^)]+)\)", css_text, re.IGNORECASE)
-        for m in matches:
-            m_clean = m.strip('"\' ')
-            full_img = urljoin(base_url, m_clean)
-            image_urls.append(full_img)
-
-    # Deduplicate and return
-    return list(dict.fromkeys(image_urls))
-
+    for style_tag in tree.css("style"):
+        css_text = style_tag.text() or ""
+        for m in _BG_URL_RE.findall(css_text):
+            add(m.strip('"\' '))
+
+    return image_urls
+
+
+def _extract_metadata(tree: LexborHTMLParser) -> Dict[str, Optional[str]]:
+    # One walk of the tree picks up every tag we look at; the rest is bookkeeping
+    title_tag = None
+    meta_by_name: Dict[str, LexborNode] = {}
+    meta_charset = None
+    meta_content_type = None
+    has_navigation = False
+    main_sections = 0
+    logo_candidates = []
 
-def _extract_metadata(html: str) -> Dict[str, Optional[str]]:
-    soup = BeautifulSoup(html, "html.parser")
-    title_tag = soup.find("title")
-    meta_theme = soup.find("meta", attrs={"name": "theme-color"})
+    for elem in tree.css(METADATA_SELECTOR):
+        tag = elem.tag
+        attrs = elem.attributes
+        if tag == 'meta':
+            name = attrs.get('name')
+            if name:
+                meta_by_name.setdefault(name, elem)
+            if meta_charset is None and 'charset' in attrs:
+                meta_charset = elem
+            if meta_content_type is None and attrs.get('http-equiv') == 'Content-Type':
+                meta_content_type = elem
+        elif tag == 'title':
+            if title_tag is None:
+                title_tag = elem
+        elif tag in ('nav', 'header'):
+            has_navigation = True
+        elif tag in ('main', 'section', 'article'):
+            main_sections += 1
+        # Try to extract brand/logo images (only logo matches are img/svg)
+        elif len(logo_candidates) < 3:  # Limit to 3 candidates
+            if tag == 'img' and attrs.get('src'):
+                logo_candidates.append(attrs.get('src'))
+            elif tag == 'svg':
+                logo_candidates.append('inline-svg')
+
+    meta_theme = meta_by_name.get("theme-color")
 
     # Try to find a <meta charset="…"> or <meta http-equiv="Content-Type" content="charset=…">
-    meta_charset = soup.find("meta", attrs={"charset": True})
     if meta_charset is None:
-        meta_charset = soup.find("meta", attrs={"http-equiv": "Content-Type"})
+        meta_charset = meta_content_type
 
     # Ensure not None
     if meta_charset is None:
         charset_value = None
     else:
         # If it had a `charset` attribute, use that, otherwise look at `content`
-        charset_value = meta_charset.get("charset") or meta_charset.get("content")
+        charset_value = meta_charset.attributes.get("charset") or meta_charset.attributes.get("content")
 
     # Extract additional visual metadata
-    body = soup.find("body")
-    html_tag = soup.find("html")
+    body = tree.body
     
     # Try to detect if this is a dark theme website
     is_dark_theme = False
     if body:
-        body_classes = body.get("class", [])
-        if isinstance(body_classes, list):
-            body_classes = " ".join(body_classes)
+        body_classes = body.attributes.get("class") or ""
         is_dark_theme = any(keyword in body_classes.lower() for keyword in ['dark', 'night', 'black'])
     
     # Look for viewport settings
-    viewport_meta = soup.find("meta", attrs={"name": "viewport"})
-    viewport_content = viewport_meta.get("content") if viewport_meta else None
-    
-    # Try to extract brand/logo images
-    logo_candidates = []
-    logo_selectors = ['img[alt*="logo"]', 'img[src*="logo"]', '.logo img', '#logo img', 'svg[class*="logo"]']
-    for selector in logo_selectors:
-        try:
-            elements = soup.select(selector)
-            for elem in elements[:3]:  # Limit to 3 candidates
-                if elem.name == 'img' and elem.get('src'):
-                    logo_candidates.append(elem.get('src'))
-                elif elem.name == 'svg':
-                    logo_candidates.append('inline-svg')
-        except:
-            continue
+    viewport_meta = meta_by_name.get("viewport")
+    viewport_content = viewport_meta.attributes.get("content") if viewport_meta else None
 
     return {
-        "title": (title_tag.get_text(strip=True) if title_tag else None),
-        "theme_color": (meta_theme.get("content") if meta_theme else None),
+        "title": (title_tag.text(strip=True) if title_tag else None),
+        "theme_color": (meta_theme.attributes.get("content") if meta_theme else None),
         "charset": charset_value,
         "is_dark_theme": is_dark_theme,
         "viewport": viewport_content,
-        "logo_candidates": logo_candidates[:3],  # Top 3 logo candidates
-        "has_navigation": bool(soup.find(['nav', 'header', '[role="navigation"]'])),
-        "main_sections": len(soup.find_all(['main', 'section', 'article'])),
+        "logo_candidates": logo_candidates,  # Top 3 logo candidates
+        "has_navigation": has_navigation,
+        "main_sections": main_sections,
     }
 
 
-
 # ───────────────────────────────────────────────────────────────────────────────
 # FALLBACK: HEADLESS BROWSER FETCH (PLAYWRIGHT)
 # ───────────────────────────────────────────────────────────────────────────────
@@ -301,81 +488,177 @@ def _extract_metadata(html: str) -> Dict[str, Optional[str]]:
 class PlaywrightScraper:
     """
     Encapsulates a long-running Playwright Browser instance in stealth mode.
-    We create one global browser at module import time to reuse across calls,
-    avoiding the overhead of launching a new browser for every request.
+    One browser is launched per process (at app startup, or lazily on first use)
+    and reused across calls, avoiding the overhead of launching a new browser for
+    every request. Fetches borrow a pre-warmed page from a small pool, each in
+    its own BrowserContext. A page is used for one fetch only: afterwards its
+    context is closed (taking cookies, storage and cache with it) and a fresh
+    page is created in the background to take its slot.
     """
 
+    _playwright = None
     _browser: Optional[Browser] = None
-    _context: Optional[BrowserContext] = None
+    # A None slot stands for a page that couldn't be created; it is retried on borrow
+    _page_pool: Optional["asyncio.Queue[Optional[Page]]"] = None
+    _refills: Set["asyncio.Task[None]"] = set()
     _lock = asyncio.Lock()  # ensure one-time startup
 
     @classmethod
     async def _initialize(cls):
         """
-        Lazily initialize the Playwright browser in stealth-like configuration.
+        Lazily initialize the Playwright browser in stealth-like configuration,
+        and fill the page pool.
         """
-        if cls._browser is None:
+        if cls._page_pool is None:
             async with cls._lock:
-                if cls._browser is None:
+                if cls._page_pool is None:
                     logger.info("Starting Playwright browser (headless Chrome)...")
                     playwright = await async_playwright().start()
 
                     # Launch a headless Chromium in stealth mode via simple flags.
                     # For a truly robust stealth, you could integrate a specialized stealth plugin.
-                    cls._browser = await playwright.chromium.launch(
-                        headless=True,
-                        args=[
-                            "--disable-blink-features=AutomationControlled",
-                            "--no-sandbox",
-                            "--disable-setuid-sandbox",
-                            "--disable-dev-shm-usage",
-                            "--disable-gpu",
-                        ],
-                    )
-                    cls._context = await cls._browser.new_context(
-                        user_agent=_random_user_agent(),
-                        viewport={"width": 1280, "height": 800},
-                    )
-                    # You can add more context-wide stealth configs here if needed.
+                    try:
+                        cls._browser = await playwright.chromium.launch(
+                            headless=True,
+                            args=[
+                                "--disable-blink-features=AutomationControlled",
+                                "--no-sandbox",
+                                "--disable-setuid-sandbox",
+                                "--disable-dev-shm-usage",
+                                "--disable-gpu",
+                            ],
+                        )
+                        pool: "asyncio.Queue[Optional[Page]]" = asyncio.Queue()
+                        for _ in range(PAGE_POOL_SIZE):
+                            pool.put_nowait(await cls._new_page())
+                    except Exception:
+                        # Don't leak the browser or driver process if startup fails
+                        if cls._browser:
+                            await cls._browser.close()
+                            cls._browser = None
+                        await playwright.stop()
+                        raise
+                    cls._playwright = playwright
+                    cls._page_pool = pool
+
+    @classmethod
+    async def startup(cls):
+        """
+        Launch the shared browser ahead of the first request (e.g. from a FastAPI
+        startup event). Failures are logged, not raised; the next fetch retries.
+        """
+        try:
+            await cls._initialize()
+        except Exception as e:
+            logger.warning(f"Playwright browser failed to start ({e}); will retry on first use")
+
+    @classmethod
+    async def _new_page(cls) -> Page:
+        """
+        Create a page in a fresh context on the shared browser.
+        You can add more context-wide stealth configs here if needed.
+        """
+        context: BrowserContext = await cls._browser.new_context(
+            user_agent=_next_user_agent(),
+            viewport={"width": 1280, "height": 800},
+        )
+        page = await context.new_page()
+
+        # Set up better headers
+        await page.set_extra_http_headers({
+            "Accept-Language": "en-US,en;q=0.9",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+            "Sec-Fetch-Site": "none",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-User": "?1",
+            "Sec-Fetch-Dest": "document",
+            "Upgrade-Insecure-Requests": "1",
+        })
+        return page
+
+    @classmethod
+    async def _discard(cls, page: Page):
+        """
+        Close a page that can't be reused, along with its context.
+        """
+        try:
+            await page.context.close()
+        except Exception:
+            pass
+
+    @classmethod
+    async def _borrow(cls) -> Page:
+        """
+        Take a page from the pool, creating one if its slot is empty. Raises
+        asyncio.TimeoutError if no slot frees up within PAGE_POOL_WAIT_TIMEOUT.
+        """
+        pool = cls._page_pool
+        page = await asyncio.wait_for(pool.get(), timeout=PAGE_POOL_WAIT_TIMEOUT)
+        if page is None:
+            try:
+                page = await cls._new_page()
+            except Exception:
+                pool.put_nowait(None)  # keep the slot
+                raise
+        return page
 
     @classmethod
-    async def fetch_with_playwright(cls, url: str) -> Optional[str]:
+    async def _release(cls, page: Page):
+        """
+        Close a used page with its context, so nothing carries over to the next
+        fetch, and start refilling its slot in the background.
+        """
+        await cls._discard(page)
+        pool = cls._page_pool
+        if pool is None:
+            return  # closed while this fetch was running
+        task = asyncio.create_task(cls._refill(pool))
+        cls._refills.add(task)
+        task.add_done_callback(cls._refills.discard)
+
+    @classmethod
+    async def _refill(cls, pool: "asyncio.Queue[Optional[Page]]"):
+        """
+        Put a fresh page into the pool, or an empty slot if it can't be created,
+        so the pool never shrinks.
+        """
+        try:
+            page = await cls._new_page()
+        except Exception as e:
+            logger.warning(f"Could not pre-warm a Playwright page ({e}); will retry on borrow")
+            page = None
+        if cls._page_pool is not pool:
+            # The browser was closed (and maybe restarted) in the meantime
+            if page is not None:
+                await cls._discard(page)
+            return
+        pool.put_nowait(page)
+
+    @classmethod
+    async def fetch_with_playwright(cls, url: str) -> Optional[Tuple[str, Dict[str, str]]]:
         """
         Uses Playwright to navigate to the target URL, waits for network idle,
-        then returns the fully-rendered HTML. Retries once if it fails the first time.
+        then returns the fully-rendered HTML along with the text of every linked
+        stylesheet the browser could read (absolute URL -> CSS), so they don't
+        have to be fetched again. Retries once if it fails the first time.
         """
         await cls._initialize()
-        assert cls._browser is not None and cls._context is not None
+        assert cls._page_pool is not None
 
-        page: Optional[Page] = None
         try:
-            page = await cls._context.new_page()
-            
-            # Set up request interception to handle authentication
-            await page.route("**/*", lambda route: route.continue_())
-            
-            # Set up better headers
-            await page.set_extra_http_headers({
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "Sec-Fetch-Site": "none",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-User": "?1",
-                "Sec-Fetch-Dest": "document",
-                "Upgrade-Insecure-Requests": "1",
-            })
-            
+            page = await cls._borrow()
+        except Exception as e:
+            logger.error(f"No Playwright page available ({e!r}); aborting.")
+            return None
+        try:
             logger.info(f"[Playwright] Navigating to {url}")
             
-            # Navigate with longer timeout and wait for both network and DOM
+            # Navigate with longer timeout and wait until the network settles
             await page.goto(
                 url,
                 timeout=PLAYWRIGHT_TIMEOUT,
-                wait_until=["networkidle", "domcontentloaded", "load"]
+                wait_until="networkidle"
             )
-            
-            # Wait longer for initial content
-            await asyncio.sleep(3)
 
             # Scroll to bottom to trigger lazy-loaded content
             await page.evaluate(
@@ -397,8 +680,16 @@ class PlaywrightScraper:
                 """
             )
 
-            # Wait longer after scroll for any lazy content to load
-            await asyncio.sleep(3)
+            # Wait for lazy content triggered by the scroll: the network settling
+            # and every image (including lazy ones now in view) finishing loading
+            try:
+                await page.wait_for_load_state("networkidle", timeout=LAZY_CONTENT_TIMEOUT)
+                await page.wait_for_function(
+                    "Array.from(document.images).every(img => img.complete)",
+                    timeout=LAZY_CONTENT_TIMEOUT,
+                )
+            except Exception:
+                logger.warning("Lazy content still loading after scroll; continuing anyway")
 
             # Wait for any content to appear
             try:
@@ -409,126 +700,168 @@ class PlaywrightScraper:
             except Exception:
                 logger.warning("No content found in body, but continuing anyway")
 
-            # Capture any dynamically injected <style> blocks
-            fresh_styles = await page.evaluate("""
-                Array.from(document.querySelectorAll('style'))
-                     .map(s => s.outerHTML)
-                     .join('\\n')
-            """)
-
-            # Capture any dynamically injected <link> tags
-            fresh_links = await page.evaluate("""
-                Array.from(document.querySelectorAll('link[rel="stylesheet"]'))
-                     .map(l => l.outerHTML)
-                     .join('\\n')
-            """)
+            # Capture everything needed from the rendered page in one round-trip:
+            # dynamically injected <style> blocks and <link> tags, the text of
+            # linked stylesheets, and the computed styles
+            captured = await page.evaluate("""
+                () => {
+                    // Any dynamically injected <style> blocks
+                    const styles = Array.from(document.querySelectorAll('style'))
+                        .map(s => s.outerHTML)
+                        .join('\\n');
+
+                    // Any dynamically injected <link> tags
+                    const links = Array.from(document.querySelectorAll('link[rel="stylesheet"]'))
+                        .map(l => l.outerHTML)
+                        .join('\\n');
+
+                    // The text of the linked stylesheets the browser already
+                    // loaded (cross-origin ones can't be read and are fetched later)
+                    const linkedCss = {};
+                    for (const sheet of document.styleSheets) {
+                        if (!sheet.href || !sheet.ownerNode || sheet.ownerNode.tagName !== 'LINK') continue;
+                        try {
+                            linkedCss[sheet.href] = Array.from(sheet.cssRules).map(r => r.cssText).join('\\n');
+                        } catch (e) {
+                            // cross-origin stylesheet
+                        }
+                    }
 
-            # Capture ALL computed styles, not just CSS variables
-            complete_styling = await page.evaluate("""
-                const getAllStyles = () => {
-                    const styles = {};
-                    const sheets = document.styleSheets;
+                    // ALL computed styles, not just CSS variables
+                    const getAllStyles = () => {
+                        const styles = {};
+                        const sheets = document.styleSheets;
                     
-                    // 1. Extract CSS Variables (Custom Properties)
-                    const root = document.documentElement;
-                    const rootStyles = getComputedStyle(root);
-                    const cssVars = {};
+                        // 1. Extract CSS Variables (Custom Properties)
+                        const root = document.documentElement;
+                        const rootStyles = getComputedStyle(root);
+                        const cssVars = {};
                     
-                    for (let i = 0; i < rootStyles.length; i++) {
-                        const prop = rootStyles[i];
-                        if (prop.startsWith('--')) {
-                            cssVars[prop] = rootStyles.getPropertyValue(prop);
+                        for (let i = 0; i < rootStyles.length; i++) {
+                            const prop = rootStyles[i];
+                            if (prop.startsWith('--')) {
+                                cssVars[prop] = rootStyles.getPropertyValue(prop);
+                            }
                         }
-                    }
                     
-                    // 2. Extract body and HTML background styles
-                    const bodyStyles = getComputedStyle(document.body);
-                    const htmlStyles = getComputedStyle(document.documentElement);
+                        // 2. Extract body and HTML background styles
+                        const bodyStyles = getComputedStyle(document.body);
+                        const htmlStyles = getComputedStyle(document.documentElement);
                     
-                    const backgroundCSS = [];
+                        const backgroundCSS = [];
                     
-                    // HTML background
-                    if (htmlStyles.background && htmlStyles.background !== 'rgba(0, 0, 0, 0)') {
-                        backgroundCSS.push(`html { background: ${htmlStyles.background}; }`);
-                    }
-                    if (htmlStyles.backgroundColor && htmlStyles.backgroundColor !== 'rgba(0, 0, 0, 0)') {
-                        backgroundCSS.push(`html { background-color: ${htmlStyles.backgroundColor}; }`);
-                    }
-                    if (htmlStyles.backgroundImage && htmlStyles.backgroundImage !== 'none') {
-                        backgroundCSS.push(`html { background-image: ${htmlStyles.backgroundImage}; }`);
-                    }
+                        // HTML background
+                        if (htmlStyles.background && htmlStyles.background !== 'rgba(0, 0, 0, 0)') {
+                            backgroundCSS.push(`html { background: ${htmlStyles.background}; }`);
+                        }
+                        if (htmlStyles.backgroundColor && htmlStyles.backgroundColor !== 'rgba(0, 0, 0, 0)') {
+                            backgroundCSS.push(`html { background-color: ${htmlStyles.backgroundColor}; }`);
+                        }
+                        if (htmlStyles.backgroundImage && htmlStyles.backgroundImage !== 'none') {
+                            backgroundCSS.push(`html { background-image: ${htmlStyles.backgroundImage}; }`);
+                        }
                     
-                    // Body background  
-                    if (bodyStyles.background && bodyStyles.background !== 'rgba(0, 0, 0, 0)') {
-                        backgroundCSS.push(`body { background: ${bodyStyles.background}; }`);
-                    }
-                    if (bodyStyles.backgroundColor && bodyStyles.backgroundColor !== 'rgba(0, 0, 0, 0)') {
-                        backgroundCSS.push(`body { background-color: ${bodyStyles.backgroundColor}; }`);
-                    }
-                    if (bodyStyles.backgroundImage && bodyStyles.backgroundImage !== 'none') {
-                        backgroundCSS.push(`body { background-image: ${bodyStyles.backgroundImage}; }`);
-                    }
+                        // Body background  
+                        if (bodyStyles.background && bodyStyles.background !== 'rgba(0, 0, 0, 0)') {
+                            backgroundCSS.push(`body { background: ${bodyStyles.background}; }`);
+                        }
+                        if (bodyStyles.backgroundColor && bodyStyles.backgroundColor !== 'rgba(0, 0, 0, 0)') {
+                            backgroundCSS.push(`body { background-color: ${bodyStyles.backgroundColor}; }`);
+                        }
+                        if (bodyStyles.backgroundImage && bodyStyles.backgroundImage !== 'none') {
+                            backgroundCSS.push(`body { background-image: ${bodyStyles.backgroundImage}; }`);
+                        }
                     
-                    // 3. Find elements with background gradients/images
-                    const elementsWithBackgrounds = document.querySelectorAll('*');
-                    const gradientCSS = [];
+                        // 3. Find elements with background gradients/images
+                        // Only elements that can carry one are inspected: those whose
+                        // inline style mentions it, plus those matched by a stylesheet
+                        // rule that sets it. Cross-origin sheets can't be read and are
+                        // skipped; their CSS is still captured via the <link> tags.
+                        const candidates = new Set(
+                            document.querySelectorAll('[style*="gradient"], [style*="url("]')
+                        );
+                        const collectRules = (rules) => {
+                            for (const rule of rules) {
+                                if (rule.cssRules) {
+                                    collectRules(rule.cssRules);  // @media, @supports, ...
+                                }
+                                if (!rule.selectorText || !rule.style) continue;
+                                const bg = rule.style.backgroundImage + ' ' + rule.style.background;
+                                if (!bg.includes('gradient') && !bg.includes('url(')) continue;
+                                try {
+                                    document.querySelectorAll(rule.selectorText).forEach(el => candidates.add(el));
+                                } catch (e) {
+                                    // selector not usable from querySelectorAll
+                                }
+                            }
+                        };
+                        for (const sheet of sheets) {
+                            try {
+                                collectRules(sheet.cssRules);
+                            } catch (e) {
+                                // cross-origin stylesheet
+                            }
+                        }
+                        const elementsWithBackgrounds = Array.from(candidates).sort(
+                            (a, b) => (a.compareDocumentPosition(b) & Node.DOCUMENT_POSITION_FOLLOWING) ? -1 : 1
+                        );
+                        // Read every computed style in one pass with no DOM writes in
+                        // between, so the browser resolves styles once for the batch
+                        const backgrounds = elementsWithBackgrounds.map((elem) => {
+                            const computedStyle = getComputedStyle(elem);
+                            return {
+                                elem,
+                                bgImage: computedStyle.backgroundImage,
+                                background: computedStyle.background,
+                            };
+                        });
                     
-                    elementsWithBackgrounds.forEach((elem, index) => {
-                        if (index > 100) return; // Limit to prevent excessive processing
-                        
-                        const computedStyle = getComputedStyle(elem);
-                        const bgImage = computedStyle.backgroundImage;
-                        const background = computedStyle.background;
-                        
-                        if (bgImage && bgImage !== 'none' && (bgImage.includes('gradient') || bgImage.includes('url'))) {
+                        const gradientCSS = [];
+                        backgrounds.forEach(({ elem, bgImage, background }) => {
                             let selector = elem.tagName.toLowerCase();
                             if (elem.id) selector += `#${elem.id}`;
-                            if (elem.className) {
-                                const classes = elem.className.split(' ').filter(c => c.trim());
-                                if (classes.length > 0) selector += `.${classes[0]}`;
+                            const classes = (elem.getAttribute('class') || '').split(' ').filter(c => c.trim());
+                            if (classes.length > 0) selector += `.${classes[0]}`;
+                        
+                            if (bgImage && bgImage !== 'none' && (bgImage.includes('gradient') || bgImage.includes('url'))) {
+                                gradientCSS.push(`${selector} { background-image: ${bgImage}; }`);
                             }
-                            gradientCSS.push(`${selector} { background-image: ${bgImage}; }`);
-                        }
                         
-                        if (background && background !== 'rgba(0, 0, 0, 0)' && background.includes('gradient')) {
-                            let selector = elem.tagName.toLowerCase();
-                            if (elem.id) selector += `#${elem.id}`;
-                            if (elem.className) {
-                                const classes = elem.className.split(' ').filter(c => c.trim());
-                                if (classes.length > 0) selector += `.${classes[0]}`;
+                            if (background && background !== 'rgba(0, 0, 0, 0)' && background.includes('gradient')) {
+                                gradientCSS.push(`${selector} { background: ${background}; }`);
                             }
-                            gradientCSS.push(`${selector} { background: ${background}; }`);
-                        }
-                    });
+                        });
                     
-                    // 4. Combine all styles
-                    let result = '';
+                        // 4. Combine all styles
+                        let result = '';
                     
-                    // CSS Variables first
-                    if (Object.keys(cssVars).length > 0) {
-                        result += ':root {\\n' + Object.entries(cssVars).map(([key, value]) => `  ${key}: ${value};`).join('\\n') + '\\n}\\n\\n';
-                    }
+                        // CSS Variables first
+                        if (Object.keys(cssVars).length > 0) {
+                            result += ':root {\\n' + Object.entries(cssVars).map(([key, value]) => `  ${key}: ${value};`).join('\\n') + '\\n}\\n\\n';
+                        }
                     
-                    // Background styles
-                    if (backgroundCSS.length > 0) {
-                        result += '/* Background Styles */\\n' + backgroundCSS.join('\\n') + '\\n\\n';
-                    }
+                        // Background styles
+                        if (backgroundCSS.length > 0) {
+                            result += '/* Background Styles */\\n' + backgroundCSS.join('\\n') + '\\n\\n';
+                        }
                     
-                    // Gradient/image styles
-                    if (gradientCSS.length > 0) {
-                        result += '/* Gradient and Image Backgrounds */\\n' + gradientCSS.join('\\n') + '\\n\\n';
-                    }
+                        // Gradient/image styles
+                        if (gradientCSS.length > 0) {
+                            result += '/* Gradient and Image Backgrounds */\\n' + gradientCSS.join('\\n') + '\\n\\n';
+                        }
                     
-                    return result;
-                };
-                
-                return getAllStyles();
+                        return result;
+                    };
+
+                    return { styles, links, linkedCss, computed: getAllStyles() };
+                }
             """)
+            fresh_styles = captured["styles"]
+            fresh_links = captured["links"]
+            linked_css = captured["linkedCss"]
+            complete_styling = captured["computed"]
 
-            # Get the final content
-            content = await page.content()
-            
-            # Combine all styles and content with complete styling first
+            # Combine all styles with complete styling first
             style_components = []
             if complete_styling and complete_styling.strip():
                 style_components.append(complete_styling)
@@ -538,32 +871,43 @@ class PlaywrightScraper:
                 style_components.append(fresh_styles)
             
             combined_styles = '\n'.join(style_components)
+
+            # Let the browser splice the styles in at the top of <head>, so the
+            # serialized page already contains them
+            await page.evaluate(
+                """
+                (css) => {
+                    const style = document.createElement('style');
+                    style.textContent = css;
+                    (document.head || document.documentElement).prepend(style);
+                }
+                """,
+                f"\n{combined_styles}\n",
+            )
+
+            # Get the final content
+            content = await page.content()
             
-            content = f"<style>\n{combined_styles}\n</style>\n{content}"
-            
-            return content
+            return content, linked_css
 
         except Exception as e:
             logger.warning(f"Playwright fetch failed on first attempt ({e}); retrying once...")
             try:
-                if page:
-                    await page.close()
-                
-                page = await cls._context.new_page()
+                # The page may be in a bad state; retry on a fresh one
+                await cls._discard(page)
+                page = await cls._new_page()
                 await page.goto(
                     url,
                     timeout=PLAYWRIGHT_TIMEOUT,
-                    wait_until=["networkidle", "domcontentloaded", "load"]
+                    wait_until="networkidle"
                 )
-                await asyncio.sleep(3)
                 content = await page.content()
-                return content
+                return content, {}
             except Exception as e2:
                 logger.error(f"Playwright fetch failed on second attempt ({e2}); aborting.")
                 return None
         finally:
-            if page:
-                await page.close()
+            await cls._release(page)
 
     @classmethod
     async def close(cls):
@@ -571,10 +915,14 @@ class PlaywrightScraper:
         Gracefully shut down the Playwright browser (only if your application lifecycle
         calls for it – e.g. FastAPI shutdown event).
         """
-        if cls._context:
-            await cls._context.close()
+        cls._page_pool = None
         if cls._browser:
+            # Closing the browser also closes every pooled page and context
             await cls._browser.close()
+            cls._browser = None
+        if cls._playwright:
+            await cls._playwright.stop()
+            cls._playwright = None
 
 
 # ───────────────────────────────────────────────────────────────────────────────
@@ -590,12 +938,14 @@ async def scrape_site(url: str) -> Dict[str, Optional[object]]:
       - "metadata": A small dict of extracted metadata (title, theme_color, charset).
 
     Workflow:
-      1) Try a fast & simple requests+BS4 fetch.
+      1) Try a fast & simple httpx+BS4 fetch.
       2) If static fetch fails or seems insufficient, fall back to Playwright.
       3) Inline external CSS into the HTML and collect them.
       4) Extract image URLs.
       5) Extract metadata.
       6) Return everything in a single dict.
+    The page is parsed once with BeautifulSoup for the CSS inlining, then once
+    more with selectolax for the read-only extraction passes.
     """
     # Normalize URL (ensure it has a scheme)
     parsed = urlparse(url)
@@ -605,13 +955,15 @@ async def scrape_site(url: str) -> Dict[str, Optional[object]]:
     base_url = f"{parsed.scheme}://{parsed.netloc}"
 
     # 1) Attempt fast static fetch
-    raw_html = _fetch_static_html(url)
+    user_agent = _next_user_agent()
+    soup = await _fetch_static_html(url, user_agent)
+    loaded_css: Dict[str, str] = {}
 
     # 2) If static fetch returned None or obviously incomplete, use Playwright
-    if raw_html is None:
+    if soup is None:
         logger.info("Static HTML fetch was insufficient. Using Playwright fallback...")
-        raw_html = await PlaywrightScraper.fetch_with_playwright(url)
-        if raw_html is None:
+        fetched = await PlaywrightScraper.fetch_with_playwright(url)
+        if fetched is None:
             # Both methods failed; return an error‐like dict (could also raise an exception)
             return {
                 "html": None,
@@ -620,15 +972,22 @@ async def scrape_site(url: str) -> Dict[str, Optional[object]]:
                 "metadata": None,
                 "error": "Unable to fetch page content via static or headless methods.",
             }
+        raw_html, loaded_css = fetched
+        soup = BeautifulSoup(raw_html, HTML_PARSER)
+
+    # 3) Inline CSS and collect CSS content (reusing what the browser loaded)
+    css_list = await _inline_css_and_collect(soup, base_url, user_agent, loaded_css)
 
-    # 3) Inline CSS and collect CSS content
-    inlined_html, css_list = _inline_css_and_collect(raw_html, base_url)
+    # 4) and 5) only read the page, so they run on a selectolax tree, which is
+    # far faster than BeautifulSoup for lookups
+    inlined_html = str(soup)
+    tree = LexborHTMLParser(inlined_html)
 
     # 4) Extract image URLs for hot-linking or future download
-    img_urls = _extract_image_urls(inlined_html, base_url)
+    img_urls = _extract_image_urls(tree, base_url)
 
     # 5) Extract simple metadata
-    meta = _extract_metadata(inlined_html)
+    meta = _extract_metadata(tree)
 
     return {
         "html": inlined_html,